@@ -291,10 +291,7 @@ class Uploader(threading.Thread):
 
                         hasher = StreamHasher(chunk_size=chunk_size)
                         hasher.compute(stream)
-                        referenced_files[file_name] = {
-                            hash_type: hasher.hexdigest(hash_type)
-                            for hash_type in StreamHasher.KNOWN_HASH_TYPES
-                        }
+                        referenced_files[file_name] = hasher.hexdigests()
                         referenced_files[file_name]["chunk_size"] = chunk_size
                         referenced_files[file_name]["path"] = file_name
                         referenced_files[file_name]["size"] = file_size
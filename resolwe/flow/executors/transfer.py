@@ -1,6 +1,5 @@
 """Transfer missing files to executor."""
 import asyncio
-import concurrent
 import logging
 import os
 from typing import List
@@ -140,13 +139,13 @@ async def download_data(missing_data: dict, communicator: BaseCommunicator) -> b
                 )
                 objects = response.message_data
 
-            # Execute long running task in a threadpool.
+            # Execute long running task in the default threadpool of the
+            # event loop.
             loop = asyncio.get_event_loop()
-            with concurrent.futures.ThreadPoolExecutor() as pool:
-                t = Transfer(from_connector, to_connector)
-                await loop.run_in_executor(
-                    pool, t.transfer_objects, missing_data["url"], objects
-                )
+            t = Transfer(from_connector, to_connector)
+            await loop.run_in_executor(
+                None, t.transfer_objects, missing_data["url"], objects
+            )
 
             await communicator.send_command(
                 Message.command(
@@ -65,6 +65,8 @@ class BaseStorageConnector(metaclass=abc.ABCMeta):
         self.get_ensures_data_integrity = False
         # Does connector preserves data integrity during upload.
         self.put_ensures_data_integrity = False
+        # Does connector store the hashes given to the push method.
+        self.push_stores_hashes = False
 
     @abc.abstractproperty
     def base_path(self) -> PurePath:
@@ -152,13 +154,20 @@ class BaseStorageConnector(metaclass=abc.ABCMeta):
 
     @abc.abstractmethod
     def push(
-        self, stream: BinaryIO, url: Union[str, PathLike], chunk_size: int = CHUNK_SIZE
+        self,
+        stream: BinaryIO,
+        url: Union[str, PathLike],
+        chunk_size: int = CHUNK_SIZE,
+        hashes: Optional[Dict[str, str]] = None,
     ):
         """Push data from the stream to the given URL.
 
         :param stream: given stream.
         :param url: where the data in the stream will be stored.
         :param chunk_size: the chunk_size to use.
+        :param hashes: hashes of the data in the stream. When given they are
+            stored the same way as by the method :meth:`set_hashes`. They are
+            only given to connectors that set ``push_stores_hashes``.
         """
         raise NotImplementedError
 
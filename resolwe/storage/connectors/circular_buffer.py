@@ -1,6 +1,7 @@
 """Implementation of circular buffer."""
-from threading import Condition
-from typing import Optional
+from contextlib import contextmanager
+from threading import Condition, Lock
+from typing import Iterator, List, Optional
 
 
 class CircularBuffer:
@@ -26,6 +27,8 @@ class CircularBuffer:
         self.__reading_bytes = 0
         # Is the stream closed.
         self.__closed = False
+        # Was the stream aborted by the writer.
+        self.__aborted = False
         self._bytes_read = 0
         self.name = name
 
@@ -72,6 +75,8 @@ class CircularBuffer:
         Blocks until there are not enought bytes available. If stream is
         closed then all available bytes are immediately returned.
 
+        :raises BrokenPipeError: when stream was aborted.
+
         :param size: the number of bytes to read.
         :type size: int
 
@@ -83,7 +88,9 @@ class CircularBuffer:
             # stream is "small".
             # Just make it our entire buffer size, it should be closed anyway.
             size = CircularBuffer.DEFAULT_BUFFER_LENGTH
-        ret = memoryview(bytearray(size))
+        # Copy data from the buffer directly into bytes objects instead of
+        # copying it into an intermediate buffer first.
+        parts = []
         ret_pos = 0
 
         with self.__buffer_modify:
@@ -93,22 +100,18 @@ class CircularBuffer:
                     self.__bytes_available() < self.__reading_bytes and not self.closed
                 ):
                     self.__buffer_modify.wait(CircularBuffer.DEFAULT_READ_WAIT_TIMEOUT)
+                if self.__aborted:
+                    self.__reading_bytes = 0
+                    raise BrokenPipeError("Stream was aborted by the writer.")
                 bytes_to_read = min(self.__bytes_available(), size - ret_pos)
                 slice_start = self.__tail
                 slice_end = slice_start + bytes_to_read
                 if slice_end <= self.__bs:
-                    ret[ret_pos : ret_pos + bytes_to_read] = self.__buffer[
-                        slice_start:slice_end
-                    ]
+                    parts.append(self.__buffer[slice_start:slice_end].tobytes())
                 else:  # rotation
                     slice_end -= self.__bs
-                    sep = self.__bs - slice_start
-                    ret[ret_pos : ret_pos + sep] = self.__buffer[
-                        slice_start : self.__bs
-                    ]
-                    ret[ret_pos + sep : ret_pos + sep + slice_end] = self.__buffer[
-                        0:slice_end
-                    ]
+                    parts.append(self.__buffer[slice_start : self.__bs].tobytes())
+                    parts.append(self.__buffer[0:slice_end].tobytes())
                 self.__tail = slice_end
                 ret_pos += bytes_to_read
                 self._bytes_read += bytes_to_read
@@ -120,11 +123,14 @@ class CircularBuffer:
             self.__reading_bytes = 0
             # Notify the writing thread.
             self.__buffer_modify.notify()
-            return ret[0:ret_pos].tobytes()
+            return b"".join(parts)
 
     def write(self, data: bytes) -> int:
         """Write data into the stream.
 
+        :raises BrokenPipeError: when stream is closed, so the writer stops
+            as soon as the reader closes the stream.
+
         :param data: data to be writen to the stream.
         :type data: bytes
 
@@ -136,9 +142,11 @@ class CircularBuffer:
         with self.__buffer_modify:
             # Wait for enough bytes to become available.
             # Abort if stream was closed.
-            while data_pos < len(datamv) and not self.closed:
+            while data_pos < len(datamv):
                 while not self.__can_write and not self.closed:
                     self.__buffer_modify.wait()
+                if self.closed:
+                    raise BrokenPipeError("Stream is closed.")
                 bytes_to_write = min(self.__bytes_free(), len(datamv) - data_pos)
                 slice_start = self.__head
                 slice_end = slice_start + bytes_to_write
@@ -170,6 +178,28 @@ class CircularBuffer:
         with self.__buffer_modify:
             self.__buffer_modify.notify()
 
+    def abort(self):
+        """Abort stream.
+
+        The stream is closed and reading from it raises exception, so the
+        reader does not mistake incomplete data for the whole stream.
+        """
+        self.__aborted = True
+        self.close()
+
+    def reset(self):
+        """Reset the stream so it can be used again.
+
+        The backing memory buffer is kept.
+        """
+        with self.__buffer_modify:
+            self.__tail = 0
+            self.__head = 0
+            self.__reading_bytes = 0
+            self.__closed = False
+            self.__aborted = False
+            self._bytes_read = 0
+
     def tell(self) -> int:
         """Get the number of bytes read from the stream.
 
@@ -177,3 +207,54 @@ class CircularBuffer:
         :rtype: int
         """
         return self._bytes_read
+
+
+class CircularBufferPool:
+    """Pool of circular buffers.
+
+    Buffers are reused instead of allocating a new one every time. The data
+    is streamed through the buffer, so a pooled buffer serves objects of any
+    size that is not smaller than the minimal pooled size.
+    """
+
+    def __init__(self, buffer_size: int, max_buffers: int, min_size: int = 0):
+        """Initialize the pool.
+
+        :param buffer_size: the size of the pooled buffers.
+
+        :param max_buffers: the maximal number of buffers kept in the pool.
+
+        :param min_size: the smallest requested size served from the pool.
+            Buffers for smaller sizes are allocated with the exact size
+            requested, so small objects do not occupy a whole pooled buffer.
+        """
+        self.buffer_size = buffer_size
+        self.max_buffers = max_buffers
+        self.min_size = min_size
+        self._buffers: List[CircularBuffer] = []
+        self._lock = Lock()
+
+    @contextmanager
+    def buffer(self, size: int) -> Iterator[CircularBuffer]:
+        """Get a buffer to stream size bytes through.
+
+        The pooled buffer is used when size is not smaller than the minimal
+        pooled size, otherwise a new buffer of the given size is created. The
+        pooled buffer is returned to the pool when the context exits and must
+        not be used afterwards.
+        """
+        if size < self.min_size:
+            yield CircularBuffer(buffer_size=size)
+            return
+
+        with self._lock:
+            buffer = self._buffers.pop() if self._buffers else None
+        if buffer is None:
+            buffer = CircularBuffer(buffer_size=self.buffer_size)
+        try:
+            yield buffer
+        finally:
+            buffer.reset()
+            with self._lock:
+                if len(self._buffers) < self.max_buffers:
+                    self._buffers.append(buffer)
@@ -3,3 +3,7 @@
 
 class DataTransferError(Exception):
     """Notify data transfer failure."""
+
+
+class TransferAborted(DataTransferError):
+    """Notify data transfer was aborted due to a failure in another thread."""
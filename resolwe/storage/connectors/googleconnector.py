@@ -23,6 +23,8 @@ class GoogleConnector(BaseStorageConnector):
         self.bucket_name = config["bucket"]
         self.supported_hash = ["crc32c", "md5"]
         self.hash_propery = {"md5": "md5_hash", "crc32c": "crc32c"}
+        # Hashes are uploaded as blob metadata.
+        self.push_stores_hashes = True
 
     @validate_url
     def get_object_list(self, url):
@@ -65,11 +67,17 @@ class GoogleConnector(BaseStorageConnector):
                         blob.delete()
 
     @validate_url
-    def push(self, stream, url, chunk_size=BaseStorageConnector.CHUNK_SIZE):
+    def push(
+        self, stream, url, chunk_size=BaseStorageConnector.CHUNK_SIZE, hashes=None
+    ):
         """Push data from the stream to the given URL."""
         url = os.fspath(url)
         mime_type = mimetypes.guess_type(url)[0]
         blob = self.bucket.blob(url)
+        if hashes is not None:
+            blob.metadata = {
+                k: v for (k, v) in hashes.items() if k not in self.hash_propery
+            }
         blob.upload_from_file(stream, content_type=mime_type)
 
     @validate_url
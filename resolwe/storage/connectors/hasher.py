@@ -6,6 +6,15 @@ from typing import TYPE_CHECKING, Dict, List, Optional
 
 import crcmod
 
+try:
+    import google_crc32c
+
+    # The package falls back to pure Python implementation when its C
+    # extension is not available, crcmod is faster in that case.
+    _hardware_crc32c = google_crc32c.implementation == "c"
+except ImportError:
+    _hardware_crc32c = False
+
 if TYPE_CHECKING:
     from os import PathLike
 
@@ -27,10 +36,7 @@ def compute_hashes(file: "PathLike[str]") -> Dict[str, str]:
     hasher = StreamHasher()
     with path.open("rb") as stream:
         hasher.compute(stream)
-    return {
-        hash_type: hasher.hexdigest(hash_type)
-        for hash_type in StreamHasher.KNOWN_HASH_TYPES
-    }
+    return hasher.hexdigests()
 
 
 class AWSS3ETagHash:
@@ -59,6 +65,30 @@ class AWSS3ETagHash:
             )
 
 
+class CRC32CHash:
+    """Compute CRC32C hash.
+
+    The hardware accelerated implementation from the google-crc32c package is
+    used when it is available.
+    """
+
+    def __init__(self):
+        """Initialize hasher."""
+        if _hardware_crc32c:
+            self.hasher = google_crc32c.Checksum()
+        else:
+            self.hasher = crcmod.predefined.PredefinedCrc("crc32c")
+
+    def update(self, data: bytes):
+        """Update hasher with given data."""
+        # The google-crc32c package only accepts bytes.
+        self.hasher.update(bytes(data))
+
+    def hexdigest(self) -> str:
+        """Compute and return hexdigest."""
+        return self.hasher.digest().hex()
+
+
 class StreamHasher:
     """Compute hash for data in the stream."""
 
@@ -66,7 +96,7 @@ class StreamHasher:
     _hashers = {
         "awss3etag": AWSS3ETagHash,
         "md5": hashlib.md5,
-        "crc32c": lambda: crcmod.predefined.PredefinedCrc("crc32c"),
+        "crc32c": CRC32CHash,
     }
 
     def __init__(self, hashes: Optional[List[str]] = None, chunk_size=8 * 1024 * 1024):
@@ -81,6 +111,7 @@ class StreamHasher:
         """
         self.chunk_size = chunk_size
         self.hashes = hashes or StreamHasher.KNOWN_HASH_TYPES
+        self._init_hashers()
 
     def _init_hashers(self):
         """Initialize known hashers."""
@@ -97,17 +128,61 @@ class StreamHasher:
 
         :param stream_out: output stream.
         :type stream_out: io.RawIOBase
+
+        :raises BlockingIOError: when stream_in is non-blocking and has no
+            data available.
         """
         self._init_hashers()
+        if hasattr(stream_in, "readinto"):
+            # Reuse a single buffer instead of allocating a new one per chunk.
+            buffer = memoryview(bytearray(self.chunk_size))
+
+            def read_chunk():
+                size = stream_in.readinto(buffer)
+                # Non-blocking stream returns None when no data is available,
+                # which must not be mistaken for EOF.
+                if size is None:
+                    raise BlockingIOError("No data available in the stream.")
+                return buffer[:size]
+
+        else:
+
+            def read_chunk():
+                return stream_in.read(self.chunk_size)
+
         read_bytes = self.chunk_size
         while read_bytes == self.chunk_size:
-            data = stream_in.read(self.chunk_size)
+            data = read_chunk()
             read_bytes = len(data)
             for hasher in self._hashers.values():
                 hasher.update(data)
             if stream_out is not None:
                 stream_out.write(data)
 
+    def compute_buffer(self, buffer: bytes):
+        """Compute the hash for the data in the given buffer.
+
+        The data is given to the hashers in the same chunks as in the
+        compute method so the computed hashes are the same.
+
+        :param buffer: object supporting the buffer protocol, for instance
+            bytes or mmap.
+        """
+        self._init_hashers()
+        with memoryview(buffer) as view:
+            for start in range(0, len(view) + 1, self.chunk_size):
+                with view[start : start + self.chunk_size] as data:
+                    self.update(data)
+
+    def update(self, data: bytes):
+        """Update all hashers with the given data.
+
+        Be careful when computing AWSS3ETag hash: the data must be given in
+        chunks of exactly chunk_size bytes (except the last one).
+        """
+        for hasher in self._hashers.values():
+            hasher.update(data)
+
     def digest(self, hash_type: str) -> bytes:
         """Return the digest for the given hash_type.
 
@@ -127,3 +202,83 @@ class StreamHasher:
         :rtype: str
         """
         return self._hashers[hash_type].hexdigest().lower()
+
+    def hexdigests(self) -> Dict[str, str]:
+        """Return the hex digests for all computed hash types.
+
+        :return: dictionary that contains hash types as keys and corresponding
+            hexdigests as values.
+        :rtype: Dict[str, str]
+        """
+        return {
+            hash_type: hasher.hexdigest().lower()
+            for hash_type, hasher in self._hashers.items()
+        }
+
+
+class HashingStream:
+    """Stream wrapper that hashes the data passing through it.
+
+    Data read from or written to the wrapped stream is given to the hasher,
+    so the hash is computed in the same pass as the data is transfered.
+    Methods that would move data past the hasher are not available.
+    """
+
+    _UNHASHED_ATTRIBUTES = {
+        "read1",
+        "readinto1",
+        "readline",
+        "readlines",
+        "writelines",
+        "__iter__",
+        "__next__",
+    }
+
+    def __init__(self, stream: RawIOBase, hasher: StreamHasher):
+        """Initialize the wrapper."""
+        self._stream = stream
+        self._hasher = hasher
+
+    def read(self, size: Optional[int] = None) -> bytes:
+        """Read data from the stream and update the hasher."""
+        data = self._stream.read(size)
+        self._hasher.update(data)
+        return data
+
+    def readinto(self, buffer) -> Optional[int]:
+        """Read data from the stream into buffer and update the hasher.
+
+        None is returned when a non-blocking stream has no data available.
+        """
+        view = memoryview(buffer).cast("B")
+        if hasattr(self._stream, "readinto"):
+            size = self._stream.readinto(view)
+        else:
+            data = self._stream.read(len(view))
+            size = None if data is None else len(data)
+            if size:
+                view[:size] = data
+        if size is not None:
+            self._hasher.update(view[:size])
+        return size
+
+    def write(self, data: bytes) -> int:
+        """Update the hasher and write data into the stream."""
+        self._hasher.update(data)
+        return self._stream.write(data)
+
+    def seekable(self) -> bool:
+        """Is stream seekable.
+
+        The data must pass through the stream in order for the hash to be
+        correct.
+        """
+        return False
+
+    def __getattr__(self, name):
+        """Delegate other attributes to the wrapped stream."""
+        if name in self._UNHASHED_ATTRIBUTES:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+        return getattr(self._stream, name)
@@ -1,7 +1,9 @@
 """Local Storage connector."""
+import mmap
 import os
 import shutil
-from pathlib import Path
+from pathlib import Path, PurePath
+from typing import List, Optional
 
 from .baseconnector import BaseStorageConnector, validate_url, validate_urls
 from .hasher import StreamHasher
@@ -12,6 +14,8 @@ class LocalFilesystemConnector(BaseStorageConnector):
 
     #: Read files by chunks of the given size
     REQUIRED_SETTINGS = ["path"]
+    #: Files smaller than this are read into memory at once when hashing.
+    SMALL_FILE_SIZE = 1024 * 1024  # 1 MB
 
     def __init__(self, config: dict, name: str):
         """Connector initialization."""
@@ -48,8 +52,13 @@ class LocalFilesystemConnector(BaseStorageConnector):
                 shutil.rmtree(os.fspath(self.base_path / url))
 
     @validate_url
-    def push(self, stream, url, chunk_size=BaseStorageConnector.CHUNK_SIZE):
-        """Push data from the stream to the given URL."""
+    def push(
+        self, stream, url, chunk_size=BaseStorageConnector.CHUNK_SIZE, hashes=None
+    ):
+        """Push data from the stream to the given URL.
+
+        Hashes are ignored since local connector can not store them.
+        """
         data_remaining = True
         path = self.base_path / url
         path.parent.mkdir(parents=True, exist_ok=True)
@@ -59,6 +68,24 @@ class LocalFilesystemConnector(BaseStorageConnector):
                 f.write(data)
                 data_remaining = len(data) == chunk_size
 
+    @validate_url
+    def copy_from(self, connector: "LocalFilesystemConnector", from_url, url):
+        """Copy the object at from_url on the given connector to the given URL.
+
+        The data is copied by the kernel (sendfile on Linux) without passing
+        it through Python.
+
+        :raises ValueError: when from_url is not a relative path or one of the
+            paths points outside the base path of its connector.
+        """
+        if PurePath(from_url).is_absolute():
+            raise ValueError("Argument 'from_url' must be a relative path")
+        if any(".." in PurePath(path).parts for path in (from_url, url)):
+            raise ValueError("Paths must not point outside the base path.")
+        path = self.base_path / url
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(connector.base_path / from_url, path)
+
     def multipart_push_start(self, url, size=None):
         """Start a multipart upload.
 
@@ -130,26 +157,47 @@ class LocalFilesystemConnector(BaseStorageConnector):
         """Get if the object at the given URL exist."""
         return (self.base_path / url).exists()
 
+    def _hash_file(self, path: Path, hash_types: List[str]) -> Optional[StreamHasher]:
+        """Compute the hashes of the given types for the given file.
+
+        Small files are read at once and larger files are memory-mapped so
+        they are hashed directly from the page cache.
+
+        :returns: the hasher containing computed hashes or None if the file
+            does not exist.
+        """
+        if not path.exists():
+            return None
+        if path.stat().st_size < self.SMALL_FILE_SIZE:
+            data = path.read_bytes()
+            hasher = StreamHasher(
+                chunk_size=self.multipart_chunksize, hashes=hash_types
+            )
+            hasher.compute_buffer(data)
+            return hasher
+
+        with path.open("rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hasher = StreamHasher(
+                    chunk_size=self.multipart_chunksize, hashes=hash_types
+                )
+                hasher.compute_buffer(mapped)
+        return hasher
+
     @validate_url
     def get_hashes(self, url, hash_types):
         """Get the hash of the given type for the given object."""
-        hasher = StreamHasher(chunk_size=self.multipart_chunksize, hashes=hash_types)
-        path = self.base_path / url
-        if not path.exists():
+        hasher = self._hash_file(self.base_path / url, hash_types)
+        if hasher is None:
             return None
-        with path.open("rb", self.CHUNK_SIZE) as f:
-            hasher.compute(f)
-        return {hash_type: hasher.hexdigest(hash_type) for hash_type in hash_types}
+        return hasher.hexdigests()
 
     @validate_url
     def get_hash(self, url, hash_type):
         """Get the hash of the given type for the given object."""
-        hasher = StreamHasher(chunk_size=self.multipart_chunksize, hashes=[hash_type])
-        path = self.base_path / url
-        if not path.exists():
+        hasher = self._hash_file(self.base_path / url, [hash_type])
+        if hasher is None:
             return None
-        with path.open("rb", self.CHUNK_SIZE) as f:
-            hasher.compute(f)
         return hasher.hexdigest(hash_type)
 
     @validate_url
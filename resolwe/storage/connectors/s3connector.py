@@ -34,6 +34,8 @@ class AwsS3Connector(BaseStorageConnector):
 
         # Ensured by TLS protocol used for transport.
         self.get_ensures_data_integrity = True
+        # Hashes are uploaded as object metadata.
+        self.push_stores_hashes = True
 
         self._session = None
         self._client = None
@@ -68,12 +70,18 @@ class AwsS3Connector(BaseStorageConnector):
         return getattr(self, name)
 
     @validate_url
-    def push(self, stream, url, chunk_size=BaseStorageConnector.CHUNK_SIZE):
+    def push(
+        self, stream, url, chunk_size=BaseStorageConnector.CHUNK_SIZE, hashes=None
+    ):
         """Push data from the stream to the given URL."""
         url = os.fspath(url)
         mime_type = mimetypes.guess_type(url)[0]
         extra_args = {} if mime_type is None else {"ContentType": mime_type}
         extra_args["Metadata"] = {"_upload_chunk_size": str(chunk_size)}
+        if hashes is not None:
+            extra_args["Metadata"].update(
+                {k: v for (k, v) in hashes.items() if k not in self.hash_propery}
+            )
         self.client.upload_fileobj(
             stream,
             self.bucket_name,
@@ -1,19 +1,24 @@
 """Data transfer between connectors."""
 import concurrent.futures
 import logging
+import os
+import random
+import threading
 from contextlib import suppress
 from functools import partial
 from pathlib import Path
 from time import sleep
-from typing import TYPE_CHECKING, Iterable, List, Optional, Union
+from typing import TYPE_CHECKING, Iterable, List, Optional, Set, Union
 
 import wrapt
 from requests.exceptions import ConnectionError as RequestsConnectionError
 from requests.exceptions import ReadTimeout
 
 from .baseconnector import BaseStorageConnector
-from .circular_buffer import CircularBuffer
-from .exceptions import DataTransferError
+from .circular_buffer import CircularBufferPool
+from .exceptions import DataTransferError, TransferAborted
+from .hasher import HashingStream, StreamHasher
+from .localconnector import LocalFilesystemConnector
 from .utils import paralelize
 
 if TYPE_CHECKING:
@@ -27,26 +32,90 @@ try:
 except ModuleNotFoundError:
     gcs_exceptions = []
 
+try:
+    from botocore.exceptions import ClientError as S3ClientError
+except ModuleNotFoundError:
+    S3ClientError = None
+
 
 logger = logging.getLogger(__name__)
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
 ERROR_MAX_RETRIES = 3
 ERROR_TIMEOUT = 5  # In seconds.
+ERROR_MAX_TIMEOUT = 60  # In seconds.
+# The number of threads in the pool shared by all transfers.
+MAX_TRANSFER_THREADS = 32
+# Hash computed while data is streamed. It must not depend on the size of the
+# chunks the data is read / written in.
+STREAM_HASH_TYPE = "md5"
+# Objects of at least the minimal size are streamed through reused buffers of
+# the pooled size. Smaller objects get a buffer of their own size.
+POOLED_BUFFER_SIZE = 8 * 1024 * 1024  # 8 MB
+MIN_POOLED_BUFFER_SIZE = 4 * 1024 * 1024  # 4 MB
+MAX_POOLED_BUFFERS = 4
+buffer_pool = CircularBufferPool(
+    POOLED_BUFFER_SIZE, MAX_POOLED_BUFFERS, min_size=MIN_POOLED_BUFFER_SIZE
+)
 transfer_exceptions = tuple(
     gcs_exceptions + [DataTransferError] + [RequestsConnectionError, ReadTimeout]
 )
 
+# Exceptions that may be transfer errors: other exceptions are re-raised
+# without further checks.
+retry_exceptions = transfer_exceptions + (
+    (S3ClientError,) if S3ClientError is not None else ()
+)
+
+
+def is_transfer_error(error: Exception) -> bool:
+    """Get if the given error is a (possibly transient) transfer error."""
+    if isinstance(error, transfer_exceptions):
+        return True
+    # Server side errors on S3.
+    if S3ClientError is not None and isinstance(error, S3ClientError):
+        status_code = error.response.get("ResponseMetadata", {}).get(
+            "HTTPStatusCode", 0
+        )
+        return status_code >= 500
+    return False
+
 
 @wrapt.decorator
 def retry_on_transfer_error(wrapped, instance, args, kwargs):
-    """Retry on tranfser error."""
-    for _ in range(ERROR_MAX_RETRIES):
+    """Retry on tranfser error.
+
+    The waiting time between retries grows exponentially and some random
+    jitter is added to it, so the retries from different threads are spread
+    out while storage backend recovers.
+    """
+    # The wrapped function is always called at least once.
+    attempts = max(ERROR_MAX_RETRIES, 1)
+    for retry in range(attempts):
         try:
             return wrapped(*args, **kwargs)
-        except transfer_exceptions as err:
-            connection_err = err
-            sleep(ERROR_TIMEOUT)
-
-    raise connection_err
+        except retry_exceptions as err:
+            if not is_transfer_error(err) or retry == attempts - 1:
+                raise
+            timeout = min(ERROR_TIMEOUT * 2 ** retry, ERROR_MAX_TIMEOUT)
+            sleep(timeout + random.uniform(0, timeout))
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Get the thread pool shared by all transfers in the current process.
+
+    The pool is recreated in the child process after fork since the threads
+    of the parent process do not exist there.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=MAX_TRANSFER_THREADS
+            )
+            _executor_pid = os.getpid()
+        return _executor
 
 
 class Transfer:
@@ -60,6 +129,28 @@ class Transfer:
         """Initialize transfer object."""
         self.from_connector = from_connector
         self.to_connector = to_connector
+        # The hash types used and the data integrity guarantees depend only on
+        # the connectors so they are computed once for all transfered objects.
+        self._skip_final_hash_check = (
+            from_connector.get_ensures_data_integrity
+            and to_connector.put_ensures_data_integrity
+        )
+        self._from_hash_type = next(
+            (
+                hash_type
+                for hash_type in from_connector.supported_hash
+                if hash_type in StreamHasher.KNOWN_HASH_TYPES
+            ),
+            None,
+        )
+        self._common_hash_type = next(
+            (
+                hash_type
+                for hash_type in to_connector.supported_hash
+                if hash_type in StreamHasher.KNOWN_HASH_TYPES
+            ),
+            None,
+        )
 
     def pre_processing(
         self, url: Union[str, Path], objects: Optional[List[dict]] = None
@@ -122,14 +213,41 @@ class Transfer:
 
         url = Path(url)
 
+        # Directories are not transfered so leave them out before objects are
+        # split between threads. Objects are distributed to threads in
+        # round-robin fashion: sort them by size so every thread gets a
+        # similar amount of data to transfer.
+        files_to_transfer = sorted(
+            (
+                object_
+                for object_ in objects_to_transfer
+                if not object_.get("path", "").endswith("/")
+            ),
+            key=lambda object_: object_.get("size", 0),
+            reverse=True,
+        )
+        existing_objects = self._get_existing_objects(url, files_to_transfer)
+        # When one of the chunks fails the others stop before transferring
+        # their next object instead of transferring data that is discarded.
+        abort = threading.Event()
         futures = paralelize(
-            objects=objects_to_transfer,
-            worker=partial(self.transfer_chunk, url),
+            objects=files_to_transfer,
+            worker=partial(
+                self.transfer_chunk,
+                url,
+                existing_objects=existing_objects,
+                abort=abort,
+            ),
             max_threads=max_threads,
         )
 
         # Check future results. This wil re-raise any exception raised in
-        # _transfer_chunk.
+        # _transfer_chunk. Check the aborted chunks last so the exception
+        # that caused the abort is re-raised.
+        futures = sorted(
+            futures,
+            key=lambda future: isinstance(future.exception(), TransferAborted),
+        )
         if not all(future.result() for future in futures):
             raise DataTransferError()
 
@@ -146,29 +264,84 @@ class Transfer:
 
         return None if objects_stored is objects else objects_stored
 
-    def transfer_chunk(self, url: Path, objects: Iterable[dict]) -> bool:
+    def _get_existing_objects(
+        self, url: Path, objects: List[dict]
+    ) -> Optional[Set[str]]:
+        """Get the paths of objects that exist under the url on to_connector.
+
+        Objects are listed once instead of checking every object with a
+        separate request. Listing is skipped for a single object, since it
+        would take as many requests as checking the object itself.
+
+        :returns: the set of paths or None when objects were not listed. In
+            that case every object is checked before it is transfered.
+        """
+        if len(objects) < 2:
+            return None
+        try:
+            return set(self.to_connector.get_object_list(url))
+        except Exception:
+            logger.warning(
+                "Error listing objects under url %s on connector %s, "
+                "checking every object instead.",
+                url,
+                self.to_connector.name,
+                exc_info=True,
+            )
+            return None
+
+    def transfer_chunk(
+        self,
+        url: Path,
+        objects: Iterable[dict],
+        existing_objects: Optional[Set[str]] = None,
+        abort: Optional[threading.Event] = None,
+    ) -> bool:
         """Transfer a single chunk of objects.
 
         When objects have properties `from_base_url` and `to_base_url` they
         override the `url` argument.
 
+        :param existing_objects: the set of paths of objects that exist under
+            the `url` on to_connector. When given, objects not in the set are
+            transfered without checking if they already exist on
+            to_connector.
+
+        :param abort: the event shared between chunks. It is set when the
+            transfer of the chunk fails and when it is set the transfer of
+            the chunk is aborted before the next object is transfered.
+
         :raises DataTransferError: on failure.
+        :raises TransferAborted: when the abort event is set.
         :returns: True on success.
         """
         to_connector = self.to_connector.duplicate()
         from_connector = self.from_connector.duplicate()
-        for entry in objects:
-            # Do not transfer directories.
-            if not entry["path"].endswith("/"):
-                if not self.transfer(
-                    entry.get("from_base_url", url),
-                    entry,
-                    entry.get("to_base_url", url),
-                    Path(entry["path"]),
-                    from_connector,
-                    to_connector,
-                ):
-                    raise DataTransferError()
+        try:
+            for entry in objects:
+                if abort is not None and abort.is_set():
+                    raise TransferAborted("Transfer aborted.")
+                # Do not transfer directories.
+                if not entry["path"].endswith("/"):
+                    check_existing = (
+                        existing_objects is None
+                        or "to_base_url" in entry
+                        or entry["path"] in existing_objects
+                    )
+                    if not self.transfer(
+                        entry.get("from_base_url", url),
+                        entry,
+                        entry.get("to_base_url", url),
+                        Path(entry["path"]),
+                        from_connector,
+                        to_connector,
+                        check_existing=check_existing,
+                    ):
+                        raise DataTransferError()
+        except Exception:
+            if abort is not None:
+                abort.set()
+            raise
         return True
 
     @retry_on_transfer_error
@@ -180,6 +353,7 @@ class Transfer:
         to_url: "PathLike[str]",
         from_connector: "BaseStorageConnector" = None,
         to_connector: "BaseStorageConnector" = None,
+        check_existing: bool = True,
     ) -> bool:
         """Transfer single object between two storage connectors.
 
@@ -203,6 +377,10 @@ class Transfer:
             duplicate of to_connector from the Transfer class instance is
             used.
 
+        :param check_existing: check if the object already exists on the
+            to_connector and skip the transfer when it has the right hash.
+            Set it to False when the object is known not to exist.
+
         :raises DataTransferError: on failure.
 
         :returns: True on success.
@@ -214,19 +392,15 @@ class Transfer:
         from_connector = from_connector or self.from_connector.duplicate()
 
         from_url = Path(from_base_url) / object_["path"]
-        hashes = {type_: object_[type_] for type_ in ["md5", "crc32c", "awss3etag"]}
+        to_object_url = to_base_url / to_url
+        hashes = {type_: object_[type_] for type_ in StreamHasher.KNOWN_HASH_TYPES}
 
-        skip_final_hash_check = (
-            from_connector.get_ensures_data_integrity
-            and to_connector.put_ensures_data_integrity
-        )
+        skip_final_hash_check = self._skip_final_hash_check
         if skip_final_hash_check:
             # When final check is skipped make sure that the input connector
             # hash equals to the hash given by the _object (usually read from
             # the database).
-            hash_to_check = next(
-                hash for hash in from_connector.supported_hash if hash in hashes.keys()
-            )
+            hash_to_check = self._from_hash_type
             from_connector_hash = from_connector.get_hash(from_url, hash_to_check)
             expected_hash = object_[hash_to_check]
             if expected_hash != from_connector_hash:
@@ -236,90 +410,144 @@ class Transfer:
                     f"{from_url}, expected {expected_hash}."
                 )
 
-        common_hash_type = next(
-            e for e in to_connector.supported_hash if e in hashes.keys()
-        )
+        common_hash_type = self._common_hash_type
         from_hash = hashes[common_hash_type]
 
         # Check if file already exist and has the right hash.
-        to_hash = to_connector.get_hash(to_base_url / to_url, common_hash_type)
-        if from_hash == to_hash:
+        if check_existing and from_hash == to_connector.get_hash(
+            to_object_url, common_hash_type
+        ):
             # Object exists and has the right hash.
             logger.debug(
-                "From: {}:{}".format(from_connector.name, from_url)
-                + " to: {}:{}".format(to_connector.name, to_base_url / to_url)
-                + " object exists with right hash, skipping."
+                "From: %s:%s to: %s:%s object exists with right hash, skipping.",
+                from_connector.name,
+                from_url,
+                to_connector.name,
+                to_object_url,
             )
             return True
 
+        # When to_connector ensures data integrity it is enough to hash the
+        # data while it is transfered instead of reading it back afterwards.
+        hasher = None
+        if to_connector.put_ensures_data_integrity and not skip_final_hash_check:
+            hasher = StreamHasher(hashes=[STREAM_HASH_TYPE], chunk_size=chunk_size)
+
+        def hashing(stream):
+            return stream if hasher is None else HashingStream(stream, hasher)
+
+        # The hashes are stored by the to_connector when data is pushed if
+        # it supports that. Connectors that do not are called without the
+        # hashes argument, since they may not accept it.
+        push_kwargs = (
+            {"hashes": hashes} if to_connector.push_stores_hashes and hashes else {}
+        )
+        hashes_stored = False
+
+        # When both connectors keep data on a local filesystem let the kernel
+        # copy the data without passing it through Python.
+        if (
+            isinstance(from_connector, LocalFilesystemConnector)
+            and isinstance(to_connector, LocalFilesystemConnector)
+            and hasher is None
+        ):
+            to_connector.copy_from(from_connector, from_url, to_object_url)
+
         # When object can be open directly as stream do it.
-        if from_connector.can_open_stream:
+        elif from_connector.can_open_stream:
             stream = from_connector.open_stream(from_url, "rb")
-            to_connector.push(stream, to_base_url / to_url, chunk_size=chunk_size)
+            to_connector.push(
+                hashing(stream),
+                to_object_url,
+                chunk_size=chunk_size,
+                **push_kwargs,
+            )
             stream.close()
+            hashes_stored = bool(push_kwargs)
 
         elif to_connector.can_open_stream:
-            stream = to_connector.open_stream(to_base_url / to_url, "wb")
-            from_connector.get(from_url, stream, chunk_size=chunk_size)
+            stream = to_connector.open_stream(to_object_url, "wb")
+            from_connector.get(from_url, hashing(stream), chunk_size=chunk_size)
             stream.close()
-        # Otherwise create out own stream and use threads to transfer data.
+        # Otherwise create out own stream and use threads to transfer data:
+        # download data in a thread from the shared pool and upload it in the
+        # current thread.
         else:
 
-            def future_done(stream_to_close, future):
-                stream_to_close.close()
-                if future.exception() is not None:
-                    executor.shutdown(wait=False)
-
-            data_stream = CircularBuffer(
-                buffer_size=min(200 * 1024 * 1024, object_["size"])
-            )
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                download_task = executor.submit(
-                    from_connector.get,
-                    from_url,
-                    data_stream,
-                    chunk_size=chunk_size,
-                )
-                upload_task = executor.submit(
-                    to_connector.push,
-                    data_stream,
-                    to_base_url / to_url,
-                    chunk_size=chunk_size,
-                )
-                download_task.add_done_callback(partial(future_done, data_stream))
-                futures = (download_task, upload_task)
+            def download(stream):
+                # Close the stream inside the task: the buffer is returned to
+                # the pool as soon as the task is done. On failure abort the
+                # stream so the upload fails immediately instead of storing
+                # incomplete data.
+                try:
+                    from_connector.get(from_url, stream, chunk_size=chunk_size)
+                except Exception:
+                    stream.abort()
+                    raise
+                finally:
+                    stream.close()
+
+            with buffer_pool.buffer(object_["size"]) as data_stream:
+                download_task = get_executor().submit(download, data_stream)
+                exceptions = []
+                try:
+                    to_connector.push(
+                        hashing(data_stream),
+                        to_object_url,
+                        chunk_size=chunk_size,
+                        **push_kwargs,
+                    )
+                    hashes_stored = bool(push_kwargs)
+                except Exception as exception:
+                    # Log exception to preserve original stack trace.
+                    logger.exception("Exception occured while transfering data")
+                    exceptions.append(exception)
+                finally:
+                    # Stop the download when upload fails.
+                    data_stream.close()
+
+                # Wait for the download to finish.
+                download_exception = download_task.exception()
+                # When the upload fails it closes the stream and the download
+                # stops with BrokenPipeError: report only the upload error.
+                if download_exception is not None and not (
+                    exceptions and isinstance(download_exception, BrokenPipeError)
+                ):
+                    logger.error(
+                        "Exception occured while transfering data",
+                        exc_info=download_exception,
+                    )
+                    exceptions.insert(0, download_exception)
 
             # Re-raise possible exception as DataTransferError.
-            if any(f.exception() is not None for f in futures):
-                # Log exceptions in threads to preserve original stack trace.
-                for f in futures:
-                    try:
-                        f.result()
-                    except Exception:
-                        logger.exception("Exception occured while transfering data")
-
+            if exceptions:
                 # Delete transfered data.
                 with suppress(Exception):
                     to_connector.delete(to_base_url, [to_url])
 
-                # Re-raise exception.
-                ex = [f.exception() for f in futures if f.exception() is not None]
-                messages = [str(e) for e in ex]
-                raise DataTransferError("\n\n".join(messages))
+                raise DataTransferError("\n\n".join(map(str, exceptions)))
 
         # Check hash of the uploaded object.
         if not skip_final_hash_check:
-            to_hash = to_connector.get_hash(to_base_url / to_url, common_hash_type)
+            if hasher is not None:
+                check_hash_type = STREAM_HASH_TYPE
+                from_hash = hashes[STREAM_HASH_TYPE]
+                to_hash = hasher.hexdigest(STREAM_HASH_TYPE)
+            else:
+                check_hash_type = common_hash_type
+                to_hash = to_connector.get_hash(to_object_url, common_hash_type)
             if from_hash != to_hash:
                 with suppress(Exception):
                     to_connector.delete(to_base_url, [to_url])
                 raise DataTransferError(
-                    f"Hash {common_hash_type} does not match while transfering "
-                    f"{from_url} -> {to_base_url/to_url}: using hash type "
-                    f"{common_hash_type}: expected {from_hash}, got {to_hash}."
+                    f"Hash {check_hash_type} does not match while transfering "
+                    f"{from_url} -> {to_object_url}: using hash type "
+                    f"{check_hash_type}: expected {from_hash}, got {to_hash}."
                 )
 
-        # Store computed hashes as metadata for later use.
-        to_connector.set_hashes(to_base_url / to_url, hashes)
+        # Store computed hashes as metadata for later use unless they were
+        # already stored during the upload.
+        if not hashes_stored:
+            to_connector.set_hashes(to_object_url, hashes)
 
         return True
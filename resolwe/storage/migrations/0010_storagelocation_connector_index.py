@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("storage", "0009_referencedpath_chunk_size"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="storagelocation",
+            index=models.Index(
+                condition=models.Q(status="OK"),
+                fields=["connector_name"],
+                name="idx_storagelocation_connector",
+            ),
+        ),
+    ]
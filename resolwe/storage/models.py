@@ -368,9 +368,17 @@ class StorageLocation(models.Model):
     """
 
     class Meta:
-        """Add unique constaint."""
+        """Add unique constaint and index on done locations."""
 
         unique_together = ("url", "connector_name")
+        indexes = [
+            # Storage manager looks up done locations by connector.
+            models.Index(
+                name="idx_storagelocation_connector",
+                fields=["connector_name"],
+                condition=models.Q(status="OK"),
+            ),
+        ]
 
     def __str__(self) -> str:
         """Stringify StorageLocation object."""
@@ -3,7 +3,10 @@ import random
 import time
 from concurrent.futures import ThreadPoolExecutor
 
-from resolwe.storage.connectors.transfer import CircularBuffer
+from resolwe.storage.connectors.circular_buffer import (
+    CircularBuffer,
+    CircularBufferPool,
+)
 from resolwe.test import TestCase
 
 
@@ -25,6 +28,80 @@ class CircularBufferTest(TestCase):
         self.assertEqual(stream.read(len(data)), data)
         self.assertEqual(stream.tell(), 2 * len(data))
 
+    def test_read_without_size(self):
+        stream = CircularBuffer(buffer_size=11)
+        data = b"testing"
+        stream.write(data)
+        stream.close()
+        self.assertEqual(stream.read(), data)
+        self.assertEqual(stream.read(), b"")
+
+    def test_abort(self):
+        stream = CircularBuffer(buffer_size=11)
+        stream.write(b"testing")
+        stream.abort()
+        self.assertTrue(stream.closed)
+        with self.assertRaises(BrokenPipeError):
+            stream.read(7)
+
+    def test_write_closed(self):
+        stream = CircularBuffer(buffer_size=11)
+        stream.close()
+        with self.assertRaises(BrokenPipeError):
+            stream.write(b"testing")
+
+        # The writer waiting for free space stops when the reader closes.
+        stream = CircularBuffer(buffer_size=11)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(stream.write, b"writinglargerthanbuffer")
+            self.assertEqual(stream.read(5), b"writi")
+            stream.close()
+            with self.assertRaises(BrokenPipeError):
+                future.result()
+
+    def test_reset(self):
+        stream = CircularBuffer(buffer_size=11)
+        stream.write(b"testing")
+        stream.close()
+        stream.reset()
+        self.assertFalse(stream.closed)
+        self.assertEqual(stream.tell(), 0)
+        stream.write(b"data")
+        stream.close()
+        self.assertEqual(stream.read(), b"data")
+
+    def test_pool(self):
+        pool = CircularBufferPool(buffer_size=11, max_buffers=1)
+        with pool.buffer(5) as stream:
+            self.assertEqual(stream.buffer_size, 11)
+            stream.write(b"testing")
+            stream.close()
+        with pool.buffer(11) as pooled_stream:
+            self.assertIs(pooled_stream, stream)
+            self.assertFalse(pooled_stream.closed)
+            with pool.buffer(11) as new_stream:
+                self.assertIsNot(new_stream, stream)
+        # Larger objects are streamed through the pooled buffer.
+        with pool.buffer(12) as large_stream:
+            self.assertIs(large_stream, new_stream)
+            self.assertEqual(large_stream.buffer_size, 11)
+        # At most one buffer is kept in the pool.
+        with pool.buffer(1) as pooled_stream:
+            self.assertIs(pooled_stream, new_stream)
+
+    def test_pool_small_buffer(self):
+        pool = CircularBufferPool(buffer_size=11, max_buffers=1, min_size=6)
+        with pool.buffer(5) as small_stream:
+            self.assertEqual(small_stream.buffer_size, 5)
+        with pool.buffer(6) as pooled_stream:
+            self.assertEqual(pooled_stream.buffer_size, 11)
+        # Small buffers are not kept in the pool.
+        with pool.buffer(5) as new_stream:
+            self.assertIsNot(new_stream, small_stream)
+            self.assertEqual(new_stream.buffer_size, 5)
+        with pool.buffer(7) as stream:
+            self.assertIs(stream, pooled_stream)
+
     def test_read_large_chunk(self):
         reading_bytes = 10000
         write_data = b"small"
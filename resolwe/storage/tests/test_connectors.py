@@ -0,0 +1,43 @@
+# pylint: disable=missing-docstring
+from io import BytesIO
+from unittest.mock import ANY, MagicMock
+
+from resolwe.storage.connectors import AwsS3Connector, GoogleConnector
+from resolwe.test import TestCase
+
+HASHES = {"md5": "md5hash", "crc32c": "crc32chash", "awss3etag": "etaghash"}
+
+
+class PushHashesTest(TestCase):
+    def test_s3(self):
+        connector = AwsS3Connector({"bucket": "bucket", "credentials": ""}, "S3")
+        connector.client = MagicMock()
+        self.assertTrue(connector.push_stores_hashes)
+
+        stream = BytesIO(b"data")
+        connector.push(stream, "dir/file", chunk_size=1024, hashes=HASHES)
+        connector.client.upload_fileobj.assert_called_once_with(
+            stream,
+            "bucket",
+            "dir/file",
+            Config=ANY,
+            ExtraArgs={
+                "Metadata": {
+                    "_upload_chunk_size": "1024",
+                    "md5": "md5hash",
+                    "crc32c": "crc32chash",
+                }
+            },
+        )
+
+    def test_gcs(self):
+        connector = GoogleConnector({"bucket": "bucket", "credentials": ""}, "GCS")
+        connector.bucket = MagicMock()
+        blob = connector.bucket.blob.return_value
+        self.assertTrue(connector.push_stores_hashes)
+
+        stream = BytesIO(b"data")
+        connector.push(stream, "dir/file", hashes=HASHES)
+        connector.bucket.blob.assert_called_once_with("dir/file")
+        self.assertEqual(blob.metadata, {"awss3etag": "etaghash"})
+        blob.upload_from_file.assert_called_once_with(stream, content_type=None)
@@ -1,18 +1,20 @@
 # pylint: disable=missing-docstring
-import copy
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
 from datetime import timedelta
 from threading import Event
 from unittest.mock import MagicMock, patch
 
 from django.db import connection, transaction
+from django.test import skipUnlessDBFeature
 from django.utils import timezone
 
-from resolwe.flow.models import Data
+from resolwe.flow.models import Data, Process
 from resolwe.storage.connectors import (
     AwsS3Connector,
     GoogleConnector,
     LocalFilesystemConnector,
+    Transfer,
 )
 from resolwe.storage.connectors.exceptions import DataTransferError
 from resolwe.storage.manager import Manager
@@ -24,6 +26,10 @@ from resolwe.storage.models import (
 )
 from resolwe.test import TestCase, TransactionTestCase
 
+DATA_CHECKSUM = "05bc76611c382a88817389019679f35cdb32ac65fe6662210805b588c30f71e6"
+
+NO_FILE_STORAGES = {"local": 0, "GCS": 0, "S3": 0}
+
 CONNECTORS_SETTINGS = {
     "local": {
         "connector": "resolwe.storage.connectors.localconnector.LocalFilesystemConnector",
@@ -67,31 +73,126 @@ CONNECTORS = {
 }
 
 
-@patch("resolwe.storage.models.connectors", CONNECTORS)
-@patch("resolwe.storage.manager.connectors", CONNECTORS)
-@patch("resolwe.storage.models.STORAGE_CONNECTORS", CONNECTORS_SETTINGS)
-class DecisionMakerTest(TestCase):
+class FileStorageList(list):
+    """List of file storages used in place of a queryset in mocks."""
+
+    def iterator(self):
+        """Iterate over the file storages as a queryset would."""
+        return iter(self)
+
+
+def override_rules(settings, connector_name, section, **rules):
+    """Return connectors settings with the given rules overriden.
+
+    Only the dictionaries on the path to the overriden rules are copied.
+    """
+    connector_settings = settings[connector_name]
+    config = connector_settings["config"]
+    return {
+        **settings,
+        connector_name: {
+            **connector_settings,
+            "config": {**config, section: {**config.get(section, {}), **rules}},
+        },
+    }
+
+
+def count_file_storages(decide):
+    """Return the number of file storages decide selects for every connector."""
+    return {
+        connector_name: decide(connector_name).count()
+        for connector_name in ("local", "GCS", "S3")
+    }
+
+
+@contextmanager
+def patch_manager(to_copy, to_delete, copy_single_location, delete_single_location):
+    """Patch the decision makers and the location processing of the manager."""
+    with ExitStack() as stack:
+        stack.enter_context(
+            patch.multiple(
+                "resolwe.storage.models.LocationsDoneManager",
+                to_delete=to_delete,
+                to_copy=to_copy,
+            )
+        )
+        stack.enter_context(
+            patch.multiple(
+                "resolwe.storage.manager.Manager",
+                copy_single_location=copy_single_location,
+                delete_single_location=delete_single_location,
+            )
+        )
+        yield
+
+
+def create_locations(file_storage, *connector_names, url="url"):
+    """Create done storage locations for the given connectors in one query."""
+    return StorageLocation.objects.bulk_create(
+        StorageLocation(
+            file_storage=file_storage,
+            url=url,
+            connector_name=connector_name,
+            status=StorageLocation.STATUS_DONE,
+        )
+        for connector_name in connector_names
+    )
+
+
+class PatchClassMixin:
+    """Apply the patches in class_patches once for the whole test class."""
+
+    class_patches = [
+        ("resolwe.storage.models.connectors", CONNECTORS),
+        ("resolwe.storage.manager.connectors", CONNECTORS),
+        ("resolwe.storage.models.STORAGE_CONNECTORS", CONNECTORS_SETTINGS),
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        cls._class_patchers = [patch(target, new) for target, new in cls.class_patches]
+        for patcher in cls._class_patchers:
+            patcher.start()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls._stop_class_patchers()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls._stop_class_patchers()
+
+    @classmethod
+    def _stop_class_patchers(cls):
+        for patcher in reversed(cls._class_patchers):
+            patcher.stop()
+
+
+class DecisionMakerTest(PatchClassMixin, TestCase):
     fixtures = [
         "storage_processes.yaml",
         "storage_data.yaml",
     ]
 
-    def setUp(self):
-        self.file_storage: FileStorage = FileStorage.objects.get(pk=1)
-        super().setUp()
+    @classmethod
+    def setUpTestData(cls):
+        cls.file_storage: FileStorage = FileStorage.objects.get(pk=1)
 
     def test_norule(self):
+        now = timezone.now()
         storage_location: StorageLocation = StorageLocation.objects.create(
             file_storage=self.file_storage, url="url", connector_name="S3"
         )
         FileStorage.objects.filter(pk=self.file_storage.pk).update(
-            created=timezone.now() - timedelta(days=30)
+            created=now - timedelta(days=30)
         )
         StorageLocation.objects.filter(pk=storage_location.pk).update(
-            last_update=timezone.now() - timedelta(days=30)
+            last_update=now - timedelta(days=30)
         )
-        storage_location.refresh_from_db()
-        self.file_storage.refresh_from_db()
         with patch(
             "resolwe.storage.models.STORAGE_CONNECTORS",
             {"local": CONNECTORS_SETTINGS["local"]},
@@ -102,27 +203,30 @@ class DecisionMakerTest(TestCase):
             self.assertEqual(StorageLocation.objects.to_delete("S3").count(), 0)
 
     def test_copy(self):
+        now = timezone.now()
         storage_location: StorageLocation = StorageLocation.objects.create(
             file_storage=self.file_storage,
             url="url",
             connector_name="local",
         )
         FileStorage.objects.filter(pk=self.file_storage.pk).update(
-            created=timezone.now() - timedelta(days=2)
+            created=now - timedelta(days=2)
         )
-        self.file_storage.refresh_from_db()
 
         self.assertEqual(StorageLocation.objects.to_copy("S3").count(), 0)
 
         storage_location.status = StorageLocation.STATUS_DONE
         storage_location.save()
-        self.assertEqual(StorageLocation.objects.to_copy("S3").get(), self.file_storage)
+        # The decision must be made in a single query.
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                StorageLocation.objects.to_copy("S3").get(), self.file_storage
+            )
         self.assertEqual(StorageLocation.objects.to_copy("GCS").count(), 0)
 
         FileStorage.objects.filter(pk=self.file_storage.pk).update(
-            created=timezone.now() - timedelta(days=3)
+            created=now - timedelta(days=3)
         )
-        self.file_storage.refresh_from_db()
         self.assertEqual(StorageLocation.objects.to_copy("S3").get(), self.file_storage)
         self.assertEqual(
             StorageLocation.objects.to_copy("GCS").get(), self.file_storage
@@ -138,17 +242,19 @@ class DecisionMakerTest(TestCase):
         FileStorage.objects.filter(pk=self.file_storage.pk).update(
             created=timezone.now() - timedelta(days=3)
         )
-        self.file_storage.refresh_from_db()
 
-        connectors_settings = copy.deepcopy(CONNECTORS_SETTINGS)
-        connectors_settings["S3"]["config"]["copy"]["delay"] = -1
+        connectors_settings = override_rules(
+            CONNECTORS_SETTINGS, "S3", "copy", delay=-1
+        )
         with patch("resolwe.storage.models.STORAGE_CONNECTORS", connectors_settings):
             self.assertEqual(StorageLocation.objects.to_copy("S3").count(), 0)
             self.assertEqual(
                 StorageLocation.objects.to_copy("GCS").get(), self.file_storage
             )
 
-        connectors_settings["GCS"]["config"]["copy"]["delay"] = -1
+        connectors_settings = override_rules(
+            connectors_settings, "GCS", "copy", delay=-1
+        )
         with patch("resolwe.storage.models.STORAGE_CONNECTORS", connectors_settings):
             self.assertEqual(StorageLocation.objects.to_copy("S3").count(), 0)
             self.assertEqual(StorageLocation.objects.to_copy("GCS").count(), 0)
@@ -166,18 +272,7 @@ class DecisionMakerTest(TestCase):
         self.assertEqual(StorageLocation.objects.to_delete("S3").count(), 0)
 
     def test_delete_early(self):
-        location_s3 = StorageLocation.objects.create(
-            file_storage=self.file_storage,
-            url="url",
-            connector_name="S3",
-            status=StorageLocation.STATUS_DONE,
-        )
-        StorageLocation.objects.create(
-            file_storage=self.file_storage,
-            url="url",
-            connector_name="GCS",
-            status=StorageLocation.STATUS_DONE,
-        )
+        location_s3, _ = create_locations(self.file_storage, "S3", "GCS")
         StorageLocation.objects.filter(pk=location_s3.pk).update(
             last_update=timezone.now() - timedelta(days=4)
         )
@@ -185,83 +280,52 @@ class DecisionMakerTest(TestCase):
         self.assertEqual(StorageLocation.objects.to_delete("GCS").count(), 0)
 
     def test_delete(self):
-        location_s3: StorageLocation = StorageLocation.objects.create(
-            file_storage=self.file_storage,
-            url="url",
-            connector_name="S3",
-            status=StorageLocation.STATUS_DONE,
-        )
-        StorageLocation.objects.create(
-            file_storage=self.file_storage,
-            url="url",
-            connector_name="local",
-            status=StorageLocation.STATUS_DONE,
-        )
+        location_s3, _ = create_locations(self.file_storage, "S3", "local")
         StorageLocation.objects.filter(pk=location_s3.pk).update(
             last_update=timezone.now() - timedelta(days=5)
         )
         access_log = AccessLog.objects.create(storage_location=location_s3)
-        self.assertEqual(StorageLocation.objects.to_delete("local").count(), 0)
-        self.assertEqual(StorageLocation.objects.to_delete("GCS").count(), 0)
-        self.assertEqual(StorageLocation.objects.to_delete("S3").count(), 0)
+        self.assertEqual(
+            count_file_storages(StorageLocation.objects.to_delete), NO_FILE_STORAGES
+        )
 
         access_log.delete()
         self.assertEqual(StorageLocation.objects.to_delete("local").count(), 0)
         self.assertEqual(StorageLocation.objects.to_delete("GCS").count(), 0)
 
+        # The decision must be made in a single query.
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                StorageLocation.objects.to_delete("S3").get(), self.file_storage
+            )
+
+        location_s3.status = StorageLocation.STATUS_DELETING
+        location_s3.save(update_fields=["status"])
         self.assertEqual(
-            StorageLocation.objects.to_delete("S3").get(), self.file_storage
+            count_file_storages(StorageLocation.objects.to_delete), NO_FILE_STORAGES
         )
 
-        StorageLocation.objects.filter(pk=location_s3.pk).update(
-            status=StorageLocation.STATUS_DELETING
-        )
-        self.assertEqual(StorageLocation.objects.to_delete("local").count(), 0)
-        self.assertEqual(StorageLocation.objects.to_delete("GCS").count(), 0)
-        self.assertEqual(StorageLocation.objects.to_delete("S3").count(), 0)
-
     def test_delete_negative_delay(self):
-        location_s3 = StorageLocation.objects.create(
-            file_storage=self.file_storage,
-            url="url",
-            connector_name="S3",
-            status=StorageLocation.STATUS_DONE,
-        )
-        StorageLocation.objects.create(
-            file_storage=self.file_storage,
-            url="url",
-            connector_name="local",
-            status=StorageLocation.STATUS_DONE,
-        )
+        location_s3, _ = create_locations(self.file_storage, "S3", "local")
         StorageLocation.objects.filter(pk=location_s3.pk).update(
             last_update=timezone.now() - timedelta(days=5)
         )
-        connectors_settings = copy.deepcopy(CONNECTORS_SETTINGS)
-        connectors_settings["S3"]["config"]["delete"]["delay"] = -1
+        connectors_settings = override_rules(
+            CONNECTORS_SETTINGS, "S3", "delete", delay=-1
+        )
         with patch("resolwe.storage.models.STORAGE_CONNECTORS", connectors_settings):
-            self.assertEqual(StorageLocation.objects.to_delete("local").count(), 0)
-            self.assertEqual(StorageLocation.objects.to_delete("GCS").count(), 0)
-            self.assertEqual(StorageLocation.objects.to_delete("S3").count(), 0)
+            self.assertEqual(
+                count_file_storages(StorageLocation.objects.to_delete), NO_FILE_STORAGES
+            )
 
     def test_delete_mincopy(self):
-        StorageLocation.objects.create(
-            file_storage=self.file_storage,
-            url="url",
-            connector_name="local",
-            status=StorageLocation.STATUS_DONE,
-        )
-        location_gcs = StorageLocation.objects.create(
-            file_storage=self.file_storage,
-            url="url",
-            connector_name="GCS",
-            status=StorageLocation.STATUS_DONE,
-        )
+        _, location_gcs = create_locations(self.file_storage, "local", "GCS")
         StorageLocation.objects.filter(pk=location_gcs.pk).update(
             last_update=timezone.now() - timedelta(days=5)
         )
-        self.assertEqual(StorageLocation.objects.to_delete("local").count(), 0)
-        self.assertEqual(StorageLocation.objects.to_delete("GCS").count(), 0)
-        self.assertEqual(StorageLocation.objects.to_delete("S3").count(), 0)
+        self.assertEqual(
+            count_file_storages(StorageLocation.objects.to_delete), NO_FILE_STORAGES
+        )
 
         storage_location = StorageLocation.objects.create(
             file_storage=self.file_storage,
@@ -269,9 +333,9 @@ class DecisionMakerTest(TestCase):
             connector_name="GCS1",
             status=StorageLocation.STATUS_DELETING,
         )
-        self.assertEqual(StorageLocation.objects.to_delete("local").count(), 0)
-        self.assertEqual(StorageLocation.objects.to_delete("GCS").count(), 0)
-        self.assertEqual(StorageLocation.objects.to_delete("S3").count(), 0)
+        self.assertEqual(
+            count_file_storages(StorageLocation.objects.to_delete), NO_FILE_STORAGES
+        )
 
         storage_location.status = StorageLocation.STATUS_DONE
         storage_location.save()
@@ -282,28 +346,16 @@ class DecisionMakerTest(TestCase):
         self.assertEqual(StorageLocation.objects.to_delete("S3").count(), 0)
 
     def test_delete_extended(self):
-        location_gcs = StorageLocation.objects.create(
-            file_storage=self.file_storage,
-            url="url",
-            connector_name="GCS",
-            status=StorageLocation.STATUS_DONE,
-        )
-        location_s3 = StorageLocation.objects.create(
-            file_storage=self.file_storage,
-            url="url",
-            connector_name="S3",
-            status=StorageLocation.STATUS_DONE,
-        )
-        StorageLocation.objects.filter(pk=location_gcs.pk).update(
-            last_update=timezone.now() - timedelta(days=5)
-        )
-        StorageLocation.objects.filter(pk=location_s3.pk).update(
+        location_gcs, location_s3 = create_locations(self.file_storage, "GCS", "S3")
+        StorageLocation.objects.filter(pk__in=[location_gcs.pk, location_s3.pk]).update(
             last_update=timezone.now() - timedelta(days=5)
         )
-        # Do not delete location with highest priority.
-        self.assertEqual(StorageLocation.objects.to_delete("local").count(), 0)
-        self.assertEqual(StorageLocation.objects.to_delete("GCS").count(), 0)
-        self.assertEqual(StorageLocation.objects.to_delete("S3").count(), 0)
+        with self.subTest(scenario="only remote copies"):
+            # Do not delete location with highest priority.
+            self.assertEqual(
+                count_file_storages(StorageLocation.objects.to_delete),
+                NO_FILE_STORAGES,
+            )
 
         StorageLocation.objects.create(
             file_storage=self.file_storage,
@@ -318,50 +370,55 @@ class DecisionMakerTest(TestCase):
                 "S3": MagicMock(priority=CONNECTORS["S3"].priority),
             },
         ):
-            self.assertEqual(StorageLocation.objects.to_delete("local").count(), 0)
-            self.assertEqual(
-                StorageLocation.objects.to_delete("GCS").get(), self.file_storage
-            )
-            self.assertEqual(
-                StorageLocation.objects.to_delete("S3").get(), self.file_storage
-            )
+            with self.subTest(scenario="local copy added"):
+                self.assertEqual(StorageLocation.objects.to_delete("local").count(), 0)
+                self.assertEqual(
+                    StorageLocation.objects.to_delete("GCS").get(), self.file_storage
+                )
+                self.assertEqual(
+                    StorageLocation.objects.to_delete("S3").get(), self.file_storage
+                )
 
             location_gcs.delete()
-            self.assertEqual(StorageLocation.objects.to_delete("local").count(), 0)
-            self.assertEqual(StorageLocation.objects.to_delete("GCS").count(), 0)
-            self.assertEqual(
-                StorageLocation.objects.to_delete("S3").get(), self.file_storage
-            )
+            with self.subTest(scenario="GCS copy deleted"):
+                self.assertEqual(StorageLocation.objects.to_delete("local").count(), 0)
+                self.assertEqual(StorageLocation.objects.to_delete("GCS").count(), 0)
+                self.assertEqual(
+                    StorageLocation.objects.to_delete("S3").get(), self.file_storage
+                )
 
             location_s3.delete()
-            self.assertEqual(StorageLocation.objects.to_delete("local").count(), 0)
-            self.assertEqual(StorageLocation.objects.to_delete("GCS").count(), 0)
-            self.assertEqual(StorageLocation.objects.to_delete("S3").count(), 0)
+            with self.subTest(scenario="S3 copy deleted"):
+                self.assertEqual(
+                    count_file_storages(StorageLocation.objects.to_delete),
+                    NO_FILE_STORAGES,
+                )
+
 
+class DecisionMakerOverrideRuleTest(PatchClassMixin, TestCase):
+    class_patches = [
+        ("resolwe.storage.manager.connectors", CONNECTORS),
+        ("resolwe.storage.models.STORAGE_CONNECTORS", CONNECTORS_SETTINGS),
+    ]
 
-@patch("resolwe.storage.manager.connectors", CONNECTORS)
-@patch("resolwe.storage.models.STORAGE_CONNECTORS", CONNECTORS_SETTINGS)
-class DecisionMakerOverrideRuleTest(TestCase):
     fixtures = [
         "storage_processes.yaml",
         "storage_data.yaml",
     ]
 
-    def setUp(self):
-        self.file_storage1: FileStorage = FileStorage.objects.create()
-        self.file_storage2: FileStorage = FileStorage.objects.create()
-        self.file_storage1.data.add(Data.objects.get(pk=1))
-        self.file_storage2.data.add(Data.objects.get(pk=2))
-        super().setUp()
+    @classmethod
+    def setUpTestData(cls):
+        cls.file_storage1: FileStorage = FileStorage.objects.create()
+        cls.file_storage2: FileStorage = FileStorage.objects.create()
+        cls.file_storage1.data.add(Data.objects.get(pk=1))
+        cls.file_storage2.data.add(Data.objects.get(pk=2))
 
     def test_override_process_type(self):
-        settings = copy.deepcopy(CONNECTORS_SETTINGS)
         override = {"data:test": {"delay": 10}}
         override_nonexisting = {"data:nonexisting": {"delay": 10}}
         FileStorage.objects.filter(pk=self.file_storage1.pk).update(
             created=timezone.now() - timedelta(days=6)
         )
-        self.file_storage1.refresh_from_db()
         StorageLocation.objects.create(
             file_storage=self.file_storage1,
             url="url",
@@ -375,19 +432,19 @@ class DecisionMakerOverrideRuleTest(TestCase):
         )
         self.assertEqual(StorageLocation.objects.to_copy("S3").count(), 0)
 
-        settings["GCS"]["config"]["copy"]["process_type"] = override
         with patch(
             "resolwe.storage.models.STORAGE_CONNECTORS",
-            settings,
+            override_rules(CONNECTORS_SETTINGS, "GCS", "copy", process_type=override),
         ):
-            self.assertEqual(StorageLocation.objects.to_copy("local").count(), 0)
-            self.assertEqual(StorageLocation.objects.to_copy("S3").count(), 0)
-            self.assertEqual(StorageLocation.objects.to_copy("GCS").count(), 0)
+            self.assertEqual(
+                count_file_storages(StorageLocation.objects.to_copy), NO_FILE_STORAGES
+            )
 
-        settings["GCS"]["config"]["copy"]["process_type"] = override_nonexisting
         with patch(
             "resolwe.storage.models.STORAGE_CONNECTORS",
-            settings,
+            override_rules(
+                CONNECTORS_SETTINGS, "GCS", "copy", process_type=override_nonexisting
+            ),
         ):
             self.assertEqual(StorageLocation.objects.to_copy("local").count(), 0)
             self.assertEqual(
@@ -396,13 +453,11 @@ class DecisionMakerOverrideRuleTest(TestCase):
             self.assertEqual(StorageLocation.objects.to_copy("S3").count(), 0)
 
     def test_override_data_slug(self):
-        settings = copy.deepcopy(CONNECTORS_SETTINGS)
         override = {"test_data": {"delay": 10}}
         override_nonexisting = {"data_nonexisting": {"delay": 10}}
         FileStorage.objects.filter(pk=self.file_storage1.pk).update(
             created=timezone.now() - timedelta(days=6)
         )
-        self.file_storage1.refresh_from_db()
         StorageLocation.objects.create(
             file_storage=self.file_storage1,
             url="url",
@@ -415,19 +470,19 @@ class DecisionMakerOverrideRuleTest(TestCase):
             StorageLocation.objects.to_copy("GCS").get(), self.file_storage1
         )
 
-        settings["GCS"]["config"]["copy"]["data_slug"] = override
         with patch(
             "resolwe.storage.models.STORAGE_CONNECTORS",
-            settings,
+            override_rules(CONNECTORS_SETTINGS, "GCS", "copy", data_slug=override),
         ):
-            self.assertEqual(StorageLocation.objects.to_copy("local").count(), 0)
-            self.assertEqual(StorageLocation.objects.to_copy("S3").count(), 0)
-            self.assertEqual(StorageLocation.objects.to_copy("GCS").count(), 0)
+            self.assertEqual(
+                count_file_storages(StorageLocation.objects.to_copy), NO_FILE_STORAGES
+            )
 
-        settings["GCS"]["config"]["copy"]["data_slug"] = override_nonexisting
         with patch(
             "resolwe.storage.models.STORAGE_CONNECTORS",
-            settings,
+            override_rules(
+                CONNECTORS_SETTINGS, "GCS", "copy", data_slug=override_nonexisting
+            ),
         ):
             self.assertEqual(StorageLocation.objects.to_copy("local").count(), 0)
             self.assertEqual(StorageLocation.objects.to_copy("S3").count(), 0)
@@ -436,13 +491,11 @@ class DecisionMakerOverrideRuleTest(TestCase):
             )
 
     def test_override_priority(self):
-        settings = copy.deepcopy(CONNECTORS_SETTINGS)
         override_process_type = {"test:data:": {"delay": 10}}
         override_data_slug = {"test_data": {"delay": 5}}
         FileStorage.objects.filter(pk=self.file_storage1.pk).update(
             created=timezone.now() - timedelta(days=6)
         )
-        self.file_storage1.refresh_from_db()
         StorageLocation.objects.create(
             file_storage=self.file_storage1,
             url="url",
@@ -456,8 +509,13 @@ class DecisionMakerOverrideRuleTest(TestCase):
             StorageLocation.objects.to_copy("GCS").get(), self.file_storage1
         )
 
-        settings["GCS"]["config"]["copy"]["data_slug"] = override_data_slug
-        settings["GCS"]["config"]["copy"]["process_type"] = override_process_type
+        settings = override_rules(
+            CONNECTORS_SETTINGS,
+            "GCS",
+            "copy",
+            data_slug=override_data_slug,
+            process_type=override_process_type,
+        )
 
         with patch(
             "resolwe.storage.models.STORAGE_CONNECTORS",
@@ -475,26 +533,58 @@ class DecisionMakerOverrideRuleTest(TestCase):
             "resolwe.storage.models.STORAGE_CONNECTORS",
             settings,
         ):
-            self.assertEqual(StorageLocation.objects.to_copy("local").count(), 0)
-            self.assertEqual(StorageLocation.objects.to_copy("S3").count(), 0)
-            self.assertEqual(StorageLocation.objects.to_copy("GCS").count(), 0)
+            self.assertEqual(
+                count_file_storages(StorageLocation.objects.to_copy), NO_FILE_STORAGES
+            )
 
 
-@patch("resolwe.storage.models.STORAGE_CONNECTORS", CONNECTORS_SETTINGS)
-@patch("resolwe.storage.manager.connectors", CONNECTORS)
-@patch("resolwe.storage.models.connectors", CONNECTORS)
-class ManagerTest(TransactionTestCase):
-    fixtures = [
-        "storage_processes.yaml",
-        "storage_data.yaml",
-        "storage_users.yaml",
-    ]
+class ManagerTest(PatchClassMixin, TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Tasks in test_skip_locked wait for each other so they need at least
+        # two workers.
+        cls.executor = ThreadPoolExecutor(max_workers=2)
+        # The manager keeps no state between runs so it can be shared.
+        cls.manager = Manager()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+        super().tearDownClass()
 
     def setUp(self):
-        self.file_storage1: FileStorage = FileStorage.objects.get(pk=1)
-        self.file_storage2: FileStorage = FileStorage.objects.get(pk=2)
-        self.manager = Manager()
         super().setUp()
+        # Database is flushed after every test so create only the objects
+        # the tests need instead of loading the fixtures.
+        process = Process.objects.create(
+            contributor=self.contributor,
+            name="test.process",
+            slug="test_process",
+            type="data:test:",
+            category="test:category:2",
+            persistence=Process.PERSISTENCE_RAW,
+            run={"language": "bash", "program": ""},
+        )
+        self.file_storage1, self.file_storage2 = FileStorage.objects.bulk_create(
+            [FileStorage(), FileStorage()]
+        )
+        Data.objects.bulk_create(
+            Data(
+                contributor=self.contributor,
+                process=process,
+                name=name,
+                slug=slug,
+                status=Data.STATUS_DONE,
+                checksum=DATA_CHECKSUM,
+                size=42,
+                location=file_storage,
+            )
+            for name, slug, file_storage in (
+                ("Test data", "test_data", self.file_storage1),
+                ("Test data 2", "test_data_2", self.file_storage2),
+            )
+        )
 
     def test_process(self):
         process_copy_mock = MagicMock()
@@ -511,57 +601,57 @@ class ManagerTest(TransactionTestCase):
         self.assertEqual(process_copy_mock.call_count, 1)
         self.assertEqual(process_delete_mock.call_count, 1)
 
+    @skipUnlessDBFeature("has_select_for_update_skip_locked")
     def test_skip_locked(self):
         rows_locked = Event()
         manager_finished = Event()
 
-        StorageLocation.objects.create(
-            file_storage=self.file_storage1,
-            url="url1",
-            connector_name="local",
-            status=StorageLocation.STATUS_DONE,
-        )
-        StorageLocation.objects.create(
-            file_storage=self.file_storage2,
-            url="url2",
-            connector_name="local",
-            status=StorageLocation.STATUS_DONE,
+        StorageLocation.objects.bulk_create(
+            StorageLocation(
+                file_storage=file_storage,
+                url=url,
+                connector_name="local",
+                status=StorageLocation.STATUS_DONE,
+            )
+            for file_storage, url in (
+                (self.file_storage1, "url1"),
+                (self.file_storage2, "url2"),
+            )
         )
 
         def task_a(lock_ids=[]):
             with transaction.atomic():
-                list(FileStorage.objects.select_for_update().filter(id__in=lock_ids))
+                # Only the rows must be locked, their content is not needed.
+                list(
+                    FileStorage.objects.select_for_update()
+                    .filter(id__in=lock_ids)
+                    .values_list("id", flat=True)
+                )
                 rows_locked.set()
                 manager_finished.wait()
             connection.close()
 
         def task_b():
             rows_locked.wait()
-            self.manager = Manager()
             self.manager.process()
             manager_finished.set()
             connection.close()
 
         process_copy_mock = MagicMock()
         process_delete_mock = MagicMock()
-        copy = MagicMock(return_value=FileStorage.objects.all())
-        delete = MagicMock(return_value=FileStorage.objects.all())
-
-        with patch.multiple(
-            "resolwe.storage.models.LocationsDoneManager",
-            to_delete=delete,
-            to_copy=copy,
-        ):
-            with patch.multiple(
-                "resolwe.storage.manager.Manager",
-                copy_single_location=process_copy_mock,
-                delete_single_location=process_delete_mock,
-            ):
-                with ThreadPoolExecutor() as executor:
-                    executor.submit(
-                        task_a, [self.file_storage1.id, self.file_storage2.id]
-                    )
-                    executor.submit(task_b)
+        file_storages = FileStorageList([self.file_storage1, self.file_storage2])
+        copy = MagicMock(return_value=file_storages)
+        delete = MagicMock(return_value=file_storages)
+
+        with patch_manager(copy, delete, process_copy_mock, process_delete_mock):
+            futures = [
+                self.executor.submit(
+                    task_a, [self.file_storage1.id, self.file_storage2.id]
+                ),
+                self.executor.submit(task_b),
+            ]
+            for future in futures:
+                future.result()
 
         process_copy_mock.assert_not_called()
         process_delete_mock.assert_not_called()
@@ -570,38 +660,28 @@ class ManagerTest(TransactionTestCase):
         manager_finished.clear()
         process_copy_mock = MagicMock()
         process_delete_mock = MagicMock()
-        copy = MagicMock(
-            return_value=FileStorage.objects.filter(pk=self.file_storage1.pk)
-        )
+        copy = MagicMock(return_value=FileStorageList([self.file_storage1]))
         delete = MagicMock(
             side_effect=[
-                FileStorage.objects.filter(pk=self.file_storage2.pk),
-                FileStorage.objects.none(),
-                FileStorage.objects.none(),
+                FileStorageList([self.file_storage2]),
+                FileStorageList(),
+                FileStorageList(),
             ]
         )
-        with patch.multiple(
-            "resolwe.storage.models.LocationsDoneManager",
-            to_delete=delete,
-            to_copy=copy,
-        ):
-            with patch.multiple(
-                "resolwe.storage.manager.Manager",
-                copy_single_location=process_copy_mock,
-                delete_single_location=process_delete_mock,
-            ):
-                with ThreadPoolExecutor() as executor:
-                    executor.submit(task_a, [self.file_storage1.id])
-                    executor.submit(task_b)
+        with patch_manager(copy, delete, process_copy_mock, process_delete_mock):
+            futures = [
+                self.executor.submit(task_a, [self.file_storage1.id]),
+                self.executor.submit(task_b),
+            ]
+            for future in futures:
+                future.result()
 
         process_copy_mock.assert_not_called()
         process_delete_mock.assert_called_once_with(self.file_storage2, "local")
 
     def test_transfer(self):
-        FileStorage.objects.filter(pk=self.file_storage1.pk).update(
-            created=timezone.now() - timedelta(days=2)
-        )
-        self.file_storage1.refresh_from_db()
+        self.file_storage1.created = timezone.now() - timedelta(days=2)
+        self.file_storage1.save(update_fields=["created"])
         location_local = StorageLocation.objects.create(
             file_storage=self.file_storage1,
             url="url",
@@ -612,10 +692,9 @@ class ManagerTest(TransactionTestCase):
             path="testme.txt",
         )
         path.storage_locations.add(location_local)
-        transfer_objects = MagicMock(return_value=None)
-        transfer_instance = MagicMock(transfer_objects=transfer_objects)
-        transfer_module = MagicMock(return_value=transfer_instance)
-        with patch("resolwe.storage.models.Transfer", transfer_module):
+        with patch.object(
+            Transfer, "transfer_objects", return_value=None
+        ) as transfer_objects:
             self.manager.process_copy()
         transfer_objects.assert_called_once()
         self.assertEqual(len(transfer_objects.call_args[0]), 2)
@@ -633,13 +712,8 @@ class ManagerTest(TransactionTestCase):
         self.assertIsNotNone(access_log.finished)
 
     def test_transfer_failed(self):
-        def raise_datatransfererror(*args, **kwargs):
-            raise DataTransferError()
-
-        FileStorage.objects.filter(pk=self.file_storage1.pk).update(
-            created=timezone.now() - timedelta(days=2)
-        )
-        self.file_storage1.refresh_from_db()
+        self.file_storage1.created = timezone.now() - timedelta(days=2)
+        self.file_storage1.save(update_fields=["created"])
         location_local = StorageLocation.objects.create(
             file_storage=self.file_storage1,
             url="url",
@@ -650,9 +724,6 @@ class ManagerTest(TransactionTestCase):
             path="testme.txt",
         )
         path.storage_locations.add(location_local)
-        transfer_objects = MagicMock(side_effect=raise_datatransfererror)
-        transfer_instance = MagicMock(transfer_objects=transfer_objects)
-        transfer_module = MagicMock(return_value=transfer_instance)
         with patch.dict(
             CONNECTORS,
             {
@@ -660,7 +731,9 @@ class ManagerTest(TransactionTestCase):
                 "S3": MagicMock(priority=CONNECTORS["S3"].priority),
             },
         ):
-            with patch("resolwe.storage.models.Transfer", transfer_module):
+            with patch.object(
+                Transfer, "transfer_objects", side_effect=DataTransferError
+            ) as transfer_objects:
                 self.manager.process_copy()
         transfer_objects.assert_called_once()
         self.assertEqual(len(transfer_objects.call_args[0]), 2)
@@ -685,20 +758,10 @@ class ManagerTest(TransactionTestCase):
         # Do not delete.
         process_copy_mock = MagicMock()
         process_delete_mock = MagicMock()
-        copy = MagicMock(return_value=FileStorage.objects.none())
-        delete = MagicMock(return_value=FileStorage.objects.none())
-        with patch.multiple(
-            "resolwe.storage.models.LocationsDoneManager",
-            to_delete=delete,
-            to_copy=copy,
-        ):
-            with patch.multiple(
-                "resolwe.storage.manager.Manager",
-                copy_single_location=process_copy_mock,
-                delete_single_location=process_delete_mock,
-            ):
-                self.manager = Manager()
-                self.manager.process()
+        copy = MagicMock(return_value=FileStorageList())
+        delete = MagicMock(return_value=FileStorageList())
+        with patch_manager(copy, delete, process_copy_mock, process_delete_mock):
+            self.manager.process()
         self.assertEqual(copy.call_count, 3)
         self.assertEqual(delete.call_count, 3)
         process_copy_mock.assert_not_called()
@@ -707,27 +770,17 @@ class ManagerTest(TransactionTestCase):
         # Delete location_local.
         delete_data = MagicMock()
         location_local.delete_data = delete_data()
-        copy = MagicMock(return_value=FileStorage.objects.none())
+        copy = MagicMock(return_value=FileStorageList())
         delete = MagicMock(
             side_effect=[
-                FileStorage.objects.filter(pk=location_local.file_storage.pk),
-                FileStorage.objects.none(),
-                FileStorage.objects.none(),
+                FileStorageList([location_local.file_storage]),
+                FileStorageList(),
+                FileStorageList(),
             ]
         )
 
-        with patch.multiple(
-            "resolwe.storage.models.LocationsDoneManager",
-            to_delete=delete,
-            to_copy=copy,
-        ):
-            with patch.multiple(
-                "resolwe.storage.manager.Manager",
-                copy_single_location=process_copy_mock,
-                delete_single_location=process_delete_mock,
-            ):
-                self.manager = Manager()
-                self.manager.process()
+        with patch_manager(copy, delete, process_copy_mock, process_delete_mock):
+            self.manager.process()
         self.assertEqual(copy.call_count, 3)
         process_copy_mock.assert_not_called()
         delete_data.assert_called_once_with()
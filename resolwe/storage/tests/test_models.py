@@ -1,7 +1,9 @@
 # pylint: disable=missing-docstring
 from datetime import timedelta
+from io import StringIO
 from unittest.mock import MagicMock, patch
 
+from django.core.management import call_command
 from django.db.utils import IntegrityError
 from django.utils import timezone
 
@@ -16,7 +18,7 @@ from resolwe.storage.models import (
     ReferencedPath,
     StorageLocation,
 )
-from resolwe.test import TransactionTestCase
+from resolwe.test import TestCase, TransactionTestCase
 
 CONNECTORS_SETTINGS = {
     "local": {
@@ -310,3 +312,16 @@ class AccessLogTest(TransactionTestCase):
         )
         self.assertIsNone(log.finished)
         self.assertLessEqual(timezone.now() - log.started, timedelta(seconds=1))
+
+
+class MigrationsTest(TestCase):
+    def test_migrations_match_models(self):
+        # Exits with non-zero status when a model change (e.g. an index) has
+        # no migration or the migration differs from the model.
+        output = StringIO()
+        call_command(
+            "makemigrations", "storage", check=True, dry_run=True, stdout=output
+        )
+        self.assertEqual(
+            output.getvalue().strip(), "No changes detected in app 'storage'"
+        )
@@ -2,10 +2,11 @@
 import hashlib
 import os
 import tempfile
+from io import BytesIO
 
 import crcmod
 
-from resolwe.storage.connectors.hasher import StreamHasher
+from resolwe.storage.connectors.hasher import HashingStream, StreamHasher
 from resolwe.test import TestCase
 
 tmp_dir = tempfile.TemporaryDirectory()
@@ -35,3 +36,71 @@ class StreamHasherTest(TestCase):
         md5_hexdigest, crc32c_hexdigest = hashes(path("1"))
         self.assertEqual(hasher.hexdigest("md5").lower(), md5_hexdigest.lower())
         self.assertEqual(hasher.hexdigest("crc32c").lower(), crc32c_hexdigest.lower())
+        self.assertEqual(
+            hasher.hexdigests(),
+            {
+                hash_type: hasher.hexdigest(hash_type)
+                for hash_type in StreamHasher.KNOWN_HASH_TYPES
+            },
+        )
+
+    def test_hashing_stream(self):
+        data = b"testingdata" * 100000
+        md5_hexdigest = hashlib.md5(data).hexdigest()
+
+        hasher = StreamHasher(hashes=["md5"])
+        stream = HashingStream(BytesIO(data), hasher)
+        self.assertFalse(stream.seekable())
+        for _ in iter(lambda: stream.read(12345), b""):
+            pass
+        self.assertEqual(hasher.hexdigest("md5"), md5_hexdigest)
+
+        hasher = StreamHasher(hashes=["md5"])
+        output = BytesIO()
+        stream = HashingStream(output, hasher)
+        for i in range(0, len(data), 12345):
+            stream.write(data[i : i + 12345])
+        self.assertEqual(output.getvalue(), data)
+        self.assertEqual(hasher.hexdigest("md5"), md5_hexdigest)
+
+    def test_hashing_stream_readinto(self):
+        data = os.urandom(100000)
+        md5_hexdigest = hashlib.md5(data).hexdigest()
+        hasher = StreamHasher(hashes=["md5"])
+        stream = HashingStream(BytesIO(data), hasher)
+        buffer = bytearray(12345)
+        output = BytesIO()
+        for size in iter(lambda: stream.readinto(buffer), 0):
+            output.write(buffer[:size])
+        self.assertEqual(output.getvalue(), data)
+        self.assertEqual(hasher.hexdigest("md5"), md5_hexdigest)
+
+    def test_hashing_stream_unhashed_methods(self):
+        stream = HashingStream(BytesIO(b"line\n"), StreamHasher(hashes=["md5"]))
+        for name in ["read1", "readline", "readlines", "writelines", "__iter__"]:
+            with self.subTest(name=name):
+                self.assertFalse(hasattr(stream, name))
+        self.assertTrue(hasattr(stream, "close"))
+
+    def test_compute_non_blocking(self):
+        class NonBlockingStream(BytesIO):
+            def readinto(self, buffer):
+                return None
+
+        hasher = StreamHasher(hashes=["md5"], chunk_size=1024)
+        with self.assertRaises(BlockingIOError):
+            hasher.compute(NonBlockingStream(b"data"))
+
+    def test_compute_buffer(self):
+        chunk_size = 1024
+        for size in [0, 1, chunk_size, 3 * chunk_size, 3 * chunk_size + 7]:
+            data = os.urandom(size)
+            stream_hasher = StreamHasher(chunk_size=chunk_size)
+            stream_hasher.compute(BytesIO(data))
+            buffer_hasher = StreamHasher(chunk_size=chunk_size)
+            buffer_hasher.compute_buffer(data)
+            for hash_type in StreamHasher.KNOWN_HASH_TYPES:
+                self.assertEqual(
+                    buffer_hasher.hexdigest(hash_type),
+                    stream_hasher.hexdigest(hash_type),
+                )
@@ -1,14 +1,90 @@
 # pylint: disable=missing-docstring
-from pathlib import Path
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path, PurePath
 from time import time
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, call, patch
 
-from resolwe.storage.connectors import Transfer, connectors
-from resolwe.storage.connectors.exceptions import DataTransferError
-from resolwe.storage.connectors.transfer import retry_on_transfer_error
+from resolwe.storage.connectors import LocalFilesystemConnector, Transfer, connectors
+from resolwe.storage.connectors.baseconnector import BaseStorageConnector
+from resolwe.storage.connectors.circular_buffer import CircularBufferPool
+from resolwe.storage.connectors.exceptions import DataTransferError, TransferAborted
+from resolwe.storage.connectors.hasher import StreamHasher
+from resolwe.storage.connectors.transfer import S3ClientError, retry_on_transfer_error
+from resolwe.storage.connectors.utils import get_transfer_object
 from resolwe.test import TestCase
 
 
+class MemoryConnector(BaseStorageConnector):
+    """Connector that keeps objects in memory and can not open streams."""
+
+    REQUIRED_SETTINGS = []
+
+    def __init__(self, config, name):
+        super().__init__(config, name)
+        self.supported_hash = ["md5"]
+        self.objects = {}
+        # Fail after the given number of bytes is transfered.
+        self.fail_get_after = None
+        self.fail_push_after = None
+
+    @property
+    def base_path(self):
+        return PurePath("")
+
+    def duplicate(self):
+        return self
+
+    def get_object_list(self, url):
+        prefix = os.path.join(url, "")
+        return [key[len(prefix) :] for key in self.objects if key.startswith(prefix)]
+
+    def push(self, stream, url, chunk_size=BaseStorageConnector.CHUNK_SIZE):
+        url = os.fspath(url)
+        self.objects[url] = b""
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            self.objects[url] += chunk
+            if (
+                self.fail_push_after is not None
+                and len(self.objects[url]) >= self.fail_push_after
+            ):
+                raise ConnectionError("Push failed.")
+
+    def get(self, url, stream, chunk_size=BaseStorageConnector.CHUNK_SIZE):
+        data = self.objects[os.fspath(url)]
+        for position in range(0, len(data), chunk_size):
+            if self.fail_get_after is not None and position >= self.fail_get_after:
+                raise ConnectionError("Get failed.")
+            stream.write(data[position : position + chunk_size])
+
+    def exists(self, url):
+        return os.fspath(url) in self.objects
+
+    def get_hash(self, url, hash_type):
+        hashes = self.get_hashes(url, [hash_type])
+        return None if hashes is None else hashes[hash_type]
+
+    def get_hashes(self, url, hash_types):
+        if not self.exists(url):
+            return None
+        hasher = StreamHasher(hashes=hash_types)
+        hasher.compute_buffer(self.objects[os.fspath(url)])
+        return hasher.hexdigests()
+
+    def set_hashes(self, url, hashes):
+        pass
+
+    def delete(self, url, urls):
+        for delete_url in urls:
+            self.objects.pop(os.fspath(PurePath(url) / delete_url), None)
+
+    def presigned_url(self, url, expiration=10, force_download=False):
+        return None
+
+
 class TransferTest(TestCase):
     def setUp(self):
         self.local = connectors["local"]
@@ -18,7 +94,47 @@ class TransferTest(TestCase):
         t = Transfer(self.local, self.local)
         with patch.object(Transfer, "transfer_chunk") as transfer_mock:
             t.transfer_objects("base", [{}])
-        transfer_mock.assert_called_once_with(Path("base"), [{}])
+        transfer_mock.assert_called_once_with(
+            Path("base"), [{}], existing_objects=None, abort=ANY
+        )
+
+    def test_existing_objects_listing(self):
+        t = Transfer(self.local, self.local)
+        objects = [{"path": "first"}, {"path": "second"}]
+        with patch.object(Transfer, "transfer_chunk") as transfer_mock:
+            with patch.object(
+                self.local, "get_object_list", return_value=["first"]
+            ) as list_mock:
+                t.transfer_objects("base", objects, max_threads=1)
+        list_mock.assert_called_once_with(Path("base"))
+        transfer_mock.assert_called_once_with(
+            Path("base"), objects, existing_objects={"first"}, abort=ANY
+        )
+
+        # A single object is checked directly instead of listing objects.
+        with patch.object(Transfer, "transfer_chunk") as transfer_mock:
+            with patch.object(self.local, "get_object_list") as list_mock:
+                t.transfer_objects("base", objects[:1])
+        list_mock.assert_not_called()
+        transfer_mock.assert_called_once_with(
+            Path("base"), objects[:1], existing_objects=None, abort=ANY
+        )
+
+    def test_existing_objects_listing_error(self):
+        t = Transfer(self.local, self.local)
+        objects = [{"path": "first"}, {"path": "second"}]
+        with patch.object(Transfer, "transfer_chunk") as transfer_mock:
+            with patch.object(
+                self.local, "get_object_list", side_effect=ConnectionError
+            ):
+                with self.assertLogs(
+                    "resolwe.storage.connectors.transfer", level="WARNING"
+                ):
+                    t.transfer_objects("base", objects, max_threads=1)
+        # Every object is checked when objects can not be listed.
+        transfer_mock.assert_called_once_with(
+            Path("base"), objects, existing_objects=None, abort=ANY
+        )
 
     def test_max_thread(self):
         t = Transfer(self.local, self.local)
@@ -34,6 +150,59 @@ class TransferTest(TestCase):
             t.transfer_objects("base", [{}] * 20, max_threads=20)
         self.assertEqual(len(transfer_mock.call_args_list), 20)
 
+    def test_distribution(self):
+        t = Transfer(self.local, self.local)
+        objects = [
+            {"path": "dir/", "size": 0},
+            {"path": "dir/small", "size": 1},
+            {"path": "dir/large", "size": 100},
+            {"path": "medium", "size": 10},
+        ]
+        with patch.object(Transfer, "transfer_chunk") as transfer_mock:
+            t.transfer_objects("base", objects, max_threads=2)
+        transfer_mock.assert_has_calls(
+            [
+                call(
+                    Path("base"),
+                    [objects[2], objects[1]],
+                    existing_objects=set(),
+                    abort=ANY,
+                ),
+                call(Path("base"), [objects[3]], existing_objects=set(), abort=ANY),
+            ],
+            any_order=True,
+        )
+        self.assertEqual(len(transfer_mock.call_args_list), 2)
+
+    def test_existing_objects(self):
+        t = Transfer(self.local, self.local)
+        objects = [{"path": "existing"}, {"path": "new"}]
+        with patch.object(Transfer, "transfer") as transfer_mock:
+            t.transfer_chunk(Path("base"), objects, existing_objects={"existing"})
+        self.assertEqual(
+            transfer_mock.call_args_list,
+            [
+                call(
+                    Path("base"),
+                    objects[0],
+                    Path("base"),
+                    Path("existing"),
+                    ANY,
+                    ANY,
+                    check_existing=True,
+                ),
+                call(
+                    Path("base"),
+                    objects[1],
+                    Path("base"),
+                    Path("new"),
+                    ANY,
+                    ANY,
+                    check_existing=False,
+                ),
+            ],
+        )
+
     def test_exception(self):
         t = Transfer(self.local, self.local)
         with patch.object(Transfer, "transfer_chunk") as transfer_mock:
@@ -41,6 +210,37 @@ class TransferTest(TestCase):
             with self.assertRaises(DataTransferError):
                 t.transfer_objects("test_url", [{}, {}])
 
+    def test_abort(self):
+        t = Transfer(self.local, self.local)
+        objects = [{"path": "first"}, {"path": "second"}]
+        abort = threading.Event()
+        with patch.object(Transfer, "transfer") as transfer_mock:
+            transfer_mock.side_effect = DataTransferError
+            with self.assertRaises(DataTransferError):
+                t.transfer_chunk(Path("base"), objects, abort=abort)
+        self.assertEqual(transfer_mock.call_count, 1)
+        self.assertTrue(abort.is_set())
+
+        with patch.object(Transfer, "transfer") as transfer_mock:
+            with self.assertRaises(TransferAborted):
+                t.transfer_chunk(Path("base"), objects, abort=abort)
+        transfer_mock.assert_not_called()
+
+    def test_abort_reraise_original(self):
+        t = Transfer(self.local, self.local)
+
+        def transfer_chunk(url, objects, existing_objects, abort):
+            if objects[0]["path"] == "fail":
+                abort.set()
+                raise DataTransferError("Original error.")
+            abort.wait(timeout=10)
+            raise TransferAborted()
+
+        objects = [{"path": "aborted", "size": 2}, {"path": "fail", "size": 1}]
+        with patch.object(Transfer, "transfer_chunk", side_effect=transfer_chunk):
+            with self.assertRaisesRegex(DataTransferError, "Original error."):
+                t.transfer_objects("base", objects, max_threads=2)
+
     @patch("resolwe.storage.connectors.transfer.ERROR_TIMEOUT", 0.1)
     @patch("resolwe.storage.connectors.transfer.ERROR_MAX_RETRIES", 3)
     def test_retry_transfer(self):
@@ -73,3 +273,200 @@ class TransferTest(TestCase):
             t.transfer_objects(
                 "test_url", [{"path": "1"}, {"path": "2"}], max_threads=1
             )
+
+    def test_transfer_filesystem(self):
+        from_dir = Path(tempfile.mkdtemp())
+        to_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, from_dir)
+        self.addCleanup(shutil.rmtree, to_dir)
+        from_connector = LocalFilesystemConnector({"path": from_dir}, "from")
+        to_connector = LocalFilesystemConnector({"path": to_dir}, "to")
+        file_ = from_dir / "base" / "dir" / "file"
+        file_.parent.mkdir(parents=True)
+        file_.write_bytes(b"testingdata" * 1000)
+        object_ = get_transfer_object(file_, from_dir / "base")
+
+        t = Transfer(from_connector, to_connector)
+        with patch(
+            "resolwe.storage.connectors.localconnector.shutil.copyfile",
+            wraps=shutil.copyfile,
+        ) as copy_mock:
+            t.transfer_objects("base", [object_])
+        copy_mock.assert_called_once()
+        self.assertEqual(
+            (to_dir / "base" / "dir" / "file").read_bytes(), file_.read_bytes()
+        )
+
+    def _memory_transfer(self):
+        from_connector = MemoryConnector({}, "from")
+        to_connector = MemoryConnector({}, "to")
+        data = os.urandom(100 * 1024)
+        from_connector.objects["base/file"] = data
+        hasher = StreamHasher()
+        hasher.compute_buffer(data)
+        object_ = {"path": "file", "size": len(data), "chunk_size": 1024}
+        object_.update(hasher.hexdigests())
+        return from_connector, to_connector, object_
+
+    def test_transfer_threaded(self):
+        from_connector, to_connector, object_ = self._memory_transfer()
+        Transfer(from_connector, to_connector).transfer_objects("base", [object_])
+        self.assertEqual(to_connector.objects, from_connector.objects)
+
+    def test_transfer_threaded_pooled_buffer(self):
+        from_connector, to_connector, object_ = self._memory_transfer()
+        # The object is streamed through a buffer much smaller than itself.
+        pool = CircularBufferPool(buffer_size=4096, max_buffers=1)
+        with patch("resolwe.storage.connectors.transfer.buffer_pool", pool):
+            Transfer(from_connector, to_connector).transfer_objects("base", [object_])
+        self.assertEqual(to_connector.objects, from_connector.objects)
+        self.assertEqual(len(pool._buffers), 1)
+
+    @patch("resolwe.storage.connectors.transfer.ERROR_MAX_RETRIES", 0)
+    def test_transfer_stream_hash(self):
+        from_connector, _, object_ = self._memory_transfer()
+        to_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, to_dir)
+        to_connector = LocalFilesystemConnector({"path": to_dir}, "to")
+        t = Transfer(from_connector, to_connector)
+
+        # The hash is computed while data is transfered and not read back.
+        with patch.object(LocalFilesystemConnector, "get_hash") as get_hash_mock:
+            t.transfer("base", object_, "base", "file", check_existing=False)
+        get_hash_mock.assert_not_called()
+        self.assertEqual(
+            (to_dir / "base" / "file").read_bytes(), from_connector.objects["base/file"]
+        )
+
+        object_["md5"] = "0" * 32
+        with patch.object(LocalFilesystemConnector, "get_hash") as get_hash_mock:
+            with self.assertRaisesRegex(DataTransferError, "Hash md5 does not match"):
+                t.transfer("base", object_, "base", "other", check_existing=False)
+        get_hash_mock.assert_not_called()
+        self.assertFalse((to_dir / "base" / "other").exists())
+
+    @patch("resolwe.storage.connectors.transfer.ERROR_MAX_RETRIES", 0)
+    def test_transfer_threaded_get_failed(self):
+        from_connector, to_connector, object_ = self._memory_transfer()
+        from_connector.fail_get_after = 50 * 1024
+        with patch.object(to_connector, "delete", wraps=to_connector.delete) as delete:
+            with self.assertRaisesRegex(DataTransferError, "Get failed."):
+                Transfer(from_connector, to_connector).transfer_objects(
+                    "base", [object_]
+                )
+        delete.assert_called_once_with(Path("base"), [Path("file")])
+        self.assertEqual(to_connector.objects, {})
+
+    @patch("resolwe.storage.connectors.transfer.ERROR_MAX_RETRIES", 0)
+    def test_transfer_threaded_push_failed(self):
+        from_connector, to_connector, object_ = self._memory_transfer()
+        to_connector.fail_push_after = 10 * 1024
+        with patch.object(to_connector, "delete", wraps=to_connector.delete) as delete:
+            with self.assertRaises(DataTransferError) as context:
+                Transfer(from_connector, to_connector).transfer_objects(
+                    "base", [object_]
+                )
+        self.assertEqual(str(context.exception), "Push failed.")
+        delete.assert_called_once_with(Path("base"), [Path("file")])
+        self.assertEqual(to_connector.objects, {})
+
+    def test_copy_from_validate_urls(self):
+        from_dir = Path(tempfile.mkdtemp())
+        to_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, from_dir)
+        self.addCleanup(shutil.rmtree, to_dir)
+        from_connector = LocalFilesystemConnector({"path": from_dir}, "from")
+        to_connector = LocalFilesystemConnector({"path": to_dir}, "to")
+        (from_dir / "file").write_bytes(b"data")
+
+        for from_url, url in [
+            ("file", "/absolute"),
+            ("/absolute", "file"),
+            ("file", "../outside"),
+            ("../outside", "file"),
+        ]:
+            with self.subTest(from_url=from_url, url=url):
+                with self.assertRaises(ValueError):
+                    to_connector.copy_from(from_connector, from_url, url)
+        self.assertEqual(list(to_dir.iterdir()), [])
+
+        to_connector.copy_from(from_connector, "file", "dir/file")
+        self.assertEqual((to_dir / "dir" / "file").read_bytes(), b"data")
+
+    def test_push_without_hashes(self):
+        class OldPushConnector(LocalFilesystemConnector):
+            """Connector with push that does not accept hashes."""
+
+            def push(self, stream, url, chunk_size=1024):
+                return super().push(stream, url, chunk_size=chunk_size)
+
+        from_dir = Path(tempfile.mkdtemp())
+        to_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, from_dir)
+        self.addCleanup(shutil.rmtree, to_dir)
+        from_connector = LocalFilesystemConnector({"path": from_dir}, "from")
+        # Stream the data through push instead of copying the file.
+        from_connector.get_ensures_data_integrity = False
+        to_connector = OldPushConnector({"path": to_dir}, "to")
+        file_ = from_dir / "base" / "file"
+        file_.parent.mkdir(parents=True)
+        file_.write_bytes(b"testingdata" * 1000)
+        object_ = get_transfer_object(file_, from_dir / "base")
+
+        t = Transfer(from_connector, to_connector)
+        with patch.object(OldPushConnector, "set_hashes") as set_hashes_mock:
+            t.transfer_objects("base", [object_])
+        self.assertEqual((to_dir / "base" / "file").read_bytes(), file_.read_bytes())
+        set_hashes_mock.assert_called_once()
+
+    @patch("resolwe.storage.connectors.transfer.ERROR_TIMEOUT", 0.1)
+    @patch("resolwe.storage.connectors.transfer.ERROR_MAX_RETRIES", 3)
+    def test_retry_other_error(self):
+        mock: MagicMock = MagicMock(side_effect=[ValueError, True])
+        with self.assertRaises(ValueError):
+            retry_on_transfer_error(mock)()
+        self.assertEqual(len(mock.call_args_list), 1)
+
+    @unittest.skipIf(S3ClientError is None, "botocore is not installed")
+    @patch("resolwe.storage.connectors.transfer.ERROR_TIMEOUT", 0.1)
+    @patch("resolwe.storage.connectors.transfer.ERROR_MAX_RETRIES", 3)
+    def test_retry_s3_server_error(self):
+        error = S3ClientError(
+            {
+                "Error": {"Code": "SlowDown"},
+                "ResponseMetadata": {"HTTPStatusCode": 503},
+            },
+            "PutObject",
+        )
+        mock: MagicMock = MagicMock(side_effect=[error, True])
+        self.assertTrue(retry_on_transfer_error(mock)())
+        self.assertEqual(len(mock.call_args_list), 2)
+
+    @unittest.skipIf(S3ClientError is None, "botocore is not installed")
+    @patch("resolwe.storage.connectors.transfer.ERROR_TIMEOUT", 0.1)
+    @patch("resolwe.storage.connectors.transfer.ERROR_MAX_RETRIES", 3)
+    def test_retry_s3_client_error(self):
+        error = S3ClientError(
+            {
+                "Error": {"Code": "NoSuchKey"},
+                "ResponseMetadata": {"HTTPStatusCode": 404},
+            },
+            "GetObject",
+        )
+        mock: MagicMock = MagicMock(side_effect=[error, True])
+        with self.assertRaises(S3ClientError):
+            retry_on_transfer_error(mock)()
+        self.assertEqual(len(mock.call_args_list), 1)
+
+    @patch("resolwe.storage.connectors.transfer.ERROR_TIMEOUT", 0.1)
+    @patch("resolwe.storage.connectors.transfer.ERROR_MAX_RETRIES", 0)
+    def test_retry_no_retries(self):
+        mock: MagicMock = MagicMock(side_effect=[True])
+        self.assertTrue(retry_on_transfer_error(mock)())
+        self.assertEqual(len(mock.call_args_list), 1)
+
+        mock.reset_mock()
+        mock.side_effect = [DataTransferError, True]
+        with self.assertRaises(DataTransferError):
+            retry_on_transfer_error(mock)()
+        self.assertEqual(len(mock.call_args_list), 1)
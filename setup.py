@@ -1,15 +1,32 @@
+import ast
 import os.path
+
 import setuptools
 
+base_dir = os.path.abspath(os.path.dirname(__file__))
+
 # Get the long description from README.
-with open("README.rst", "r") as fh:
+with open(os.path.join(base_dir, "README.rst"), "r", encoding="utf-8") as fh:
     long_description = fh.read()
 
-# Get package metadata from '__about__.py' file.
+# Get package metadata from '__about__.py' file. Only its string literal
+# assignments are parsed so that pkg_resources (imported there to look up the
+# installed version) is not loaded during the build.
 about = {}
-base_dir = os.path.abspath(os.path.dirname(__file__))
-with open(os.path.join(base_dir, "resolwe", "__about__.py"), "r") as fh:
-    exec(fh.read(), about)
+with open(
+    os.path.join(base_dir, "resolwe", "__about__.py"), "r", encoding="utf-8"
+) as fh:
+    for node in ast.parse(fh.read()).body:
+        if not isinstance(node, ast.Assign):
+            continue
+        try:
+            value = ast.literal_eval(node.value)
+        except ValueError:
+            continue
+        if isinstance(value, str):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    about[target.id] = value
 
 setuptools.setup(
     name=about["__title__"],
@@ -20,6 +37,11 @@ setuptools.setup(
     author=about["__author__"],
     author_email=about["__email__"],
     url=about["__url__"],
+    project_urls={
+        "Documentation": "https://resolwe.readthedocs.io/",
+        "Source": about["__url__"],
+        "Tracker": about["__url__"] + "/issues",
+    },
     license=about["__license__"],
     # Exclude tests from built/installed package.
     packages=setuptools.find_packages(
@@ -35,6 +57,8 @@ setuptools.setup(
             "toolkit/tools/**.py",
         ]
     },
+    # Package reads bundled files (e.g. SQL migrations) relative to __file__.
+    zip_safe=False,
     python_requires=">=3.6, <3.10",
     install_requires=[
         # XXX: Temporarily pin asgiref to 3.2.x since testing framework freezes
@@ -45,7 +69,7 @@ setuptools.setup(
         "channels~=3.0.3",
         "channels_redis~=3.2.0",
         # Storage requirement for computing hashes.
-        "crcmod",
+        "crcmod~=1.7",
         "kubernetes~=12.0.1",
         "docker~=4.4.4",
         "Django~=3.1.7",
@@ -71,10 +95,10 @@ setuptools.setup(
     extras_require={
         "storage_s3": [
             "boto3~=1.17.29",
-            "crcmod",
+            "crcmod~=1.7",
         ],
         "storage_gcs": [
-            "crcmod",
+            "crcmod~=1.7",
             "google-cloud-storage~=1.35.0",
         ],
         "docs": [
@@ -61,6 +61,10 @@ AUTHENTICATION_BACKENDS = (
 
 ANONYMOUS_USER_NAME = "public"
 
+# Test cases create users with passwords for every test and the default
+# password hasher is slow by design.
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
 # Get the current Tox testing environment
 # NOTE: This is useful for concurrently running tests with separate environments
 toxenv = os.environ.get("TOXENV", "")